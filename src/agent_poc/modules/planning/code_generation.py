@@ -1,9 +1,21 @@
-import ast
+import hashlib
+import keyword
 import re
-from typing import Any, Dict, List
+import threading
+import time
+from collections import OrderedDict
+from types import CodeType
+from typing import Any, Dict, List, Optional, Tuple
 
 import dspy
 
+from agent_poc.utils.canonical import canonicalize
+from agent_poc.utils.fast_json import dumps
+from agent_poc.utils.llm_cache import StateFingerprint, cache_llm
+
+# Typical fences: ```python ... ```, ``` ... ```
+_FENCE_RE = re.compile(r"```(?:python)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+
 
 class PythonCodeGenSignature(dspy.Signature):
     """
@@ -84,9 +96,10 @@ class PythonCodeGenSignature(dspy.Signature):
 
     """
 
-    plan: List[Dict[str, Any]] = dspy.InputField()
-    tools: Dict[str, Any] = dspy.InputField()
+    # Static inputs first so the per-plan suffix is all that changes between calls
     model_schemas: Dict[str, Any] = dspy.InputField()
+    tools: Dict[str, Any] = dspy.InputField()
+    plan: List[Dict[str, Any]] = dspy.InputField()
 
     python_code: str = dspy.OutputField(
         desc="Executable Python code implementing a function run()"
@@ -101,6 +114,7 @@ class PythonCodeGen(dspy.Module):
         codegen = PythonCodeGen()
         result = codegen(plan=plan_steps, tools=tools_dict, model_schemas=model_schemas)
         python_code = result["python_code"]
+        exec(result["python_code_obj"])  # compiled once, no re-parse needed
 
     This module does not depend on the concrete ToolInfo structure as long as `tools`
     is a JSON-serializable dict (e.g., convert ToolInfo to dict in the adapter layer).
@@ -110,13 +124,26 @@ class PythonCodeGen(dspy.Module):
         self,
         validate_syntax: bool = True,
         strip_markdown_fences: bool = True,
+        cache_ttl: Optional[float] = None,
+        cache_max_entries: int = 256,
     ) -> None:
         super().__init__()
         self._validate_syntax = validate_syntax
         self._strip_markdown_fences = strip_markdown_fences
 
+        # Exact-match response cache: key -> (monotonic timestamp, forward result),
+        # least recently used first. cache_ttl is in seconds; None keeps entries
+        # until they are evicted by the cache_max_entries cap.
+        self._cache: OrderedDict[str, Tuple[float, Dict[str, Any]]] = OrderedDict()
+        self._cache_ttl = cache_ttl
+        self._cache_max_entries = cache_max_entries
+        # The default instance is shared across threads (see planning.pipeline)
+        self._cache_lock = threading.Lock()
+
         # Use ChainOfThought so the LLM reasons internally before emitting python_code
         self.generator = dspy.ChainOfThought(PythonCodeGenSignature)
+        # Keys cached code to the generator's instructions/demos
+        self._generator_state = StateFingerprint()
 
     # dspy.Module requirement: forward must return dict/object whose fields match the Signature outputs
     def forward(
@@ -131,25 +158,172 @@ class PythonCodeGen(dspy.Module):
         model_schemas: optional Pydantic model JSON schemas for LLM field reference
         """
 
-        # 1) Invoke LLM to generate code
+        # Sort dict keys (plan step order is kept) so equivalent inputs render
+        # byte-identical prompts and hit DSPy's LM cache
+        tools = canonicalize(tools)
+        model_schemas = canonicalize(model_schemas)
+        plan = canonicalize(plan)
+
+        # 0) Serve identical (plan, tools, model_schemas) inputs from the cache,
+        #    as long as the generator program is unchanged
+        state = self._generator_state(self.generator)
+        cache_key = self._cache_key(plan, tools, model_schemas, state)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return dict(cached)
+
+        # 1) Single-step plans with literal inputs are rendered from a template;
+        #    everything else is generated by the LLM
+        code = self._try_template(plan, tools)
+        if code is None:
+            code = self._generate_code(
+                plan=plan,
+                tools=tools,
+                model_schemas=model_schemas,
+                generator_state=state,
+                strip_markdown_fences=self._strip_markdown_fences,
+            )
+
+        # 3) Optional syntax validation to catch errors early; the compiled code
+        #    object is returned so callers can exec it without parsing again
+        code_obj = self._assert_valid_python(code) if self._validate_syntax else None
+
+        output = {"python_code": code, "python_code_obj": code_obj}
+        self._cache_put(cache_key, output)
+        return dict(output)
+
+    # ------------------- Internal helpers -------------------
+
+    @cache_llm("codegen")
+    def _generate_code(
+        self,
+        *,
+        plan: List[Dict[str, Any]],
+        tools: Dict[str, Any],
+        model_schemas: Dict[str, Any],
+        generator_state: str,
+        strip_markdown_fences: bool,
+    ) -> str:
+        """
+        Ask the LLM for code implementing the plan, post-processed.
+
+        `generator_state` and `strip_markdown_fences` are not used by the call
+        (the flag is read from self); they key the cache entry to this
+        generator's program and post-processing.
+        """
         result = self.generator(
             plan=plan,
             tools=tools,
             model_schemas=model_schemas,
         )
 
-        code = result.python_code
-
-        # 2) Defensive post-process to strip markdown fences such as ```python
-        code = self._postprocess_code(code)
+        # Defensive post-process to strip markdown fences such as ```python
+        return self._postprocess_code(result.python_code)
 
-        # 3) Optional syntax validation to catch errors early
-        if self._validate_syntax:
-            self._assert_valid_python(code)
+    @staticmethod
+    def _cache_key(
+        plan: List[Dict[str, Any]],
+        tools: Dict[str, Any],
+        model_schemas: Dict[str, Any],
+        state: str = "",
+    ) -> str:
+        """Stable hash of the generator inputs, independent of dict key order."""
+        payload = dumps(
+            {"p": plan, "t": tools, "m": model_schemas, "s": state}, sort_keys=True
+        )
+        return hashlib.blake2b(payload.encode("utf-8")).hexdigest()
+
+    def _cache_get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached result for key, dropping the entry if it has expired."""
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+
+            stored_at, output = entry
+            if (
+                self._cache_ttl is not None
+                and time.monotonic() - stored_at > self._cache_ttl
+            ):
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return output
+
+    def _cache_put(self, key: str, output: Dict[str, Any]) -> None:
+        """Store output; expired entries and the least recently used overflow are dropped."""
+        with self._cache_lock:
+            now = time.monotonic()
+            if self._cache_ttl is not None:
+                expired = [
+                    k
+                    for k, (stored_at, _) in self._cache.items()
+                    if now - stored_at > self._cache_ttl
+                ]
+                for k in expired:
+                    del self._cache[k]
+
+            self._cache[key] = (now, output)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self._cache_max_entries:
+                self._cache.popitem(last=False)
+
+    @staticmethod
+    def _try_template(
+        plan: List[Dict[str, Any]], tools: Dict[str, Any]
+    ) -> Optional[str]:
+        """
+        Deterministically render a single-step plan whose inputs are all literals.
 
-        return {"python_code": code}
+        Returns None whenever the plan needs the LLM: several steps, `[*]` list
+        expansion, a tool/parameter that cannot be checked against `tools`, or
+        a required parameter missing from the inputs.
+        """
+        if len(plan) != 1:
+            return None
+
+        step = plan[0]
+        tool_name = step.get("tool")
+        output = step.get("output")
+        inputs = step.get("inputs") or {}
+
+        tool_info = tools.get(tool_name) if isinstance(tool_name, str) else None
+        if not isinstance(tool_info, dict) or not tool_name.isidentifier():
+            return None
+        if not isinstance(output, str) or not output.isidentifier():
+            return None
+        if keyword.iskeyword(output) or not isinstance(inputs, dict):
+            return None
+
+        schema = tool_info.get("input_schema") or []
+        params = {p.get("name") for p in schema}
+        if not params.issuperset(inputs):
+            return None
+        # Without an explicit "required" flag, a parameter without a default
+        # value is treated as required
+        required = {
+            p.get("name") for p in schema if p.get("required", p.get("default") is None)
+        }
+        if not required.issubset(inputs):
+            return None
+
+        for value in inputs.values():
+            if not isinstance(value, (str, int, float, bool, type(None))):
+                return None
+            if isinstance(value, str) and "[*]" in value:
+                return None
+
+        kwargs = ", ".join(f"{name}={value!r}" for name, value in inputs.items())
+        return (
+            f"from agent_poc.semantic_layer.tools import {tool_name}\n"
+            f"def run():\n"
+            f"    {output} = {tool_name}({kwargs})\n"
+            f"    return {output}"
+        )
 
-    # ------------------- Internal helpers -------------------
+    def load_state(self, state):
+        self._generator_state.reset()
+        return super().load_state(state)
 
     def _postprocess_code(self, code: str) -> str:
         """Clean up LLM output by stripping fences or extra whitespace."""
@@ -159,19 +333,26 @@ class PythonCodeGen(dspy.Module):
         code = code.strip()
 
         if self._strip_markdown_fences:
-            # Typical fences: ```python ... ```, ``` ... ```
-            fence_pattern = r"```(?:python)?\s*(.*?)```"
-            m = re.search(fence_pattern, code, flags=re.DOTALL | re.IGNORECASE)
+            # Fast path: the whole response is a single ```/```python fenced block
+            if code.startswith("```") and code.endswith("```"):
+                first_nl = code.find("\n")
+                lang = code[3:first_nl].strip().lower()
+                if first_nl != -1 and lang in ("", "python"):
+                    inner = code[first_nl + 1 : -3]
+                    if "```" not in inner:
+                        return inner.strip()
+
+            m = _FENCE_RE.search(code)
             if m:
                 code = m.group(1).strip()
 
         # Strip once more to remove any residual whitespace
         return code.strip()
 
-    def _assert_valid_python(self, code: str) -> None:
-        """Use ast.parse to verify whether the code is valid Python."""
+    def _assert_valid_python(self, code: str) -> CodeType:
+        """Compile the code to verify it is valid Python and return the code object."""
         try:
-            ast.parse(code, mode="exec")
+            return compile(code, "<codegen>", "exec")
         except SyntaxError as e:
             # Raising ValueError keeps the failure visible to the caller
             raise ValueError(f"Generated code is not valid Python: {e}") from e
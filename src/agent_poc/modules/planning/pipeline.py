@@ -2,18 +2,160 @@
 
 from __future__ import annotations
 
+import asyncio
+import logging
+import threading
+from functools import lru_cache
 from typing import Any, Dict, List, Tuple
 
+from dspy.utils.exceptions import AdapterParseError
+
 from agent_poc.modules.planning.plan_generation import TypeAwarePlanner
 from agent_poc.modules.planning.code_generation import PythonCodeGen
+from agent_poc.modules.planning.plan_cache import (
+    PlanSkeletonCache,
+    fill_skeleton_code,
+    plan_skeleton,
+)
 from agent_poc.modules.planning.schema_converters import (
     tools_to_dict,
     entities_to_dict,
     relations_to_dict,
-    models_to_dict,
+    models_to_json,
+    relation_sort_key,
+    required_models,
 )
 from agent_poc.semantic_layer.ontology import RelationKey
+from agent_poc.utils.canonical import sort_items
+from agent_poc.utils.fast_json import dumps
 from agent_poc.semantic_layer.engine import semantic_layer
+from agent_poc.semantic_layer.generated_models.container import Container
+from agent_poc.semantic_layer.generated_models.shipment import Shipment
+from agent_poc.semantic_layer.generated_models.facility import Facility
+from agent_poc.semantic_layer.generated_models.containerevent import Containerevent
+from agent_poc.semantic_layer.generated_models.city import City
+
+logger = logging.getLogger(__name__)
+
+# Entity name → generated Pydantic model
+_MODEL_CLASSES = {
+    "Container": Container,
+    "Shipment": Shipment,
+    "Facility": Facility,
+    "ContainerEvent": Containerevent,
+    "City": City,
+}
+# Build and serialize every model schema once at import (cached per class)
+models_to_json(_MODEL_CLASSES)
+
+# The ontology is static at runtime, so convert every entity/relation once here
+_ENTITY_DICT: Dict[str, Dict[str, Any]] = dict(
+    zip(semantic_layer.entities, entities_to_dict(semantic_layer.entities.values()))
+)
+_RELATION_DICT: Dict[RelationKey, Dict[str, Any]] = dict(
+    zip(
+        semantic_layer.relations,
+        relations_to_dict(semantic_layer.relations.values()),
+    )
+)
+
+# Default planner/codegen shared across calls, created lazily on first use
+_DEFAULT_PLANNER: TypeAwarePlanner | None = None
+_DEFAULT_CODEGEN: PythonCodeGen | None = None
+_DEFAULTS_LOCK = threading.Lock()
+
+# Last plan skeleton produced per intent, the prediction for speculative codegen
+_PLAN_SKELETONS = PlanSkeletonCache()
+
+
+def _get_default_planner() -> TypeAwarePlanner:
+    global _DEFAULT_PLANNER
+    if _DEFAULT_PLANNER is None:
+        with _DEFAULTS_LOCK:
+            if _DEFAULT_PLANNER is None:
+                _DEFAULT_PLANNER = TypeAwarePlanner()
+    return _DEFAULT_PLANNER
+
+
+def _get_default_codegen() -> PythonCodeGen:
+    global _DEFAULT_CODEGEN
+    if _DEFAULT_CODEGEN is None:
+        with _DEFAULTS_LOCK:
+            if _DEFAULT_CODEGEN is None:
+                _DEFAULT_CODEGEN = PythonCodeGen()
+    return _DEFAULT_CODEGEN
+
+
+def _collect_candidate_tools(
+    expanded_entities: List[str],
+    active_relations: List[RelationKey],
+) -> List[Dict[str, Any]]:
+    """Step 3.1: Candidate tools for active relations and expanded entities."""
+    # Relation tools first, then entity-level tools, deduplicated by name;
+    # converted to dict format for the LLM
+    return tools_to_dict(
+        semantic_layer.candidate_tools(active_relations, expanded_entities)
+    )
+
+
+def _prepare_schemas(
+    expanded_entities: List[str],
+    active_relations: List[RelationKey],
+    compact: bool = False,
+) -> Tuple[str, str, str]:
+    """
+    Steps 3.2-3.4: Entity, relation and Pydantic model schemas for the planner.
+
+    Returned as compact JSON text (utils.fast_json, like the model schemas) and
+    built once per combination of entities and relations, since grounding
+    yields the same few combinations across queries.
+    """
+    return _serialized_schemas(
+        tuple(expanded_entities),
+        tuple(tuple(rel) for rel in active_relations),
+        compact,
+    )
+
+
+@lru_cache(maxsize=256)
+def _serialized_schemas(
+    expanded_entities: Tuple[str, ...],
+    active_relations: Tuple[RelationKey, ...],
+    compact: bool,
+) -> Tuple[str, str, str]:
+    # Step 3.2: Prepare entity schemas for expanded entities
+    if compact:
+        entity_schemas = entities_to_dict(
+            [semantic_layer.entities[e] for e in expanded_entities], compact=True
+        )
+    else:
+        entity_schemas = [_ENTITY_DICT[e] for e in expanded_entities]
+
+    # Step 3.3: Prepare relation schemas for active relations
+    relation_schemas = [_RELATION_DICT[rel] for rel in active_relations]
+
+    # Step 3.4: Prepare Pydantic model schemas, only for the expanded entities
+    # and the models the candidate tools return, as pre-serialized JSON so
+    # DSPy does not re-encode them per call
+    needed = required_models(
+        _collect_candidate_tools(list(expanded_entities), list(active_relations)),
+        expanded_entities,
+    )
+    model_schemas = models_to_json(
+        {
+            name: cls
+            for name, cls in _MODEL_CLASSES.items()
+            if name in needed or cls.__name__ in needed
+        },
+        compact=compact,
+    )
+
+    # Sorted as the planner would sort them, so the text is canonical
+    return (
+        dumps(sort_items(entity_schemas)),
+        dumps(sort_items(relation_schemas, key=relation_sort_key)),
+        model_schemas,
+    )
 
 
 def run_planning(
@@ -24,6 +166,7 @@ def run_planning(
     active_relations: List[RelationKey],
     planner: TypeAwarePlanner | None = None,
     codegen: PythonCodeGen | None = None,
+    compact_schemas: bool = False,
 ) -> Tuple[List[Dict[str, Any]], str]:
     """
     Pipeline Step 3: Type-aware planning + code generation.
@@ -34,8 +177,10 @@ def run_planning(
         extracted_entities: Entities extracted in step 1
         expanded_entities: Entity types from semantic grounding
         active_relations: Active relations from semantic grounding
-        planner: Optional planner instance
-        codegen: Optional code generator instance
+        planner: Optional planner instance (defaults to a shared instance)
+        codegen: Optional code generator instance (defaults to a shared instance)
+        compact_schemas: Send trimmed entity/model schemas (no descriptions,
+            titles or examples) to shrink the LLM prompts
 
     Returns:
         Tuple of (plan_steps, python_code)
@@ -44,65 +189,14 @@ def run_planning(
     if not extracted_entities or not expanded_entities:
         return [], ""
 
-    planner = planner or TypeAwarePlanner()
-    codegen = codegen or PythonCodeGen()
-
-    # Step 3.1: Collect candidate tools based on active relations
-    candidate_tools_list = []
-    for rel in active_relations:
-        tools = semantic_layer.get_tools_for_relation(rel[0], rel[1], rel[2])
-        candidate_tools_list.extend(tools)
-
-    # Add entity-level tools for expanded entities
-    for entity_name in expanded_entities:
-        entity_tools = semantic_layer.get_tools_for_entity(entity_name)
-        candidate_tools_list.extend(entity_tools)
+    planner = planner or _get_default_planner()
+    codegen = codegen or _get_default_codegen()
 
-    # Remove duplicates by tool name
-    seen_tools = set()
-    unique_tools = []
-    for tool in candidate_tools_list:
-        if tool.name not in seen_tools:
-            seen_tools.add(tool.name)
-            unique_tools.append(tool)
-
-    # Convert to dict format for LLM
-    candidate_tools = tools_to_dict(unique_tools)
-
-    # Step 3.2: Prepare entity schemas for expanded entities
-    entity_schemas = entities_to_dict(
-        [semantic_layer.entities[e] for e in expanded_entities]
+    candidate_tools = _collect_candidate_tools(expanded_entities, active_relations)
+    entity_schemas, relation_schemas, model_schemas = _prepare_schemas(
+        expanded_entities, active_relations, compact_schemas
     )
 
-    # Step 3.3: Prepare relation schemas for active relations
-    relation_schemas = relations_to_dict(
-        [semantic_layer.relations[rel] for rel in active_relations]
-    )
-
-    # Step 3.4: Prepare Pydantic model schemas
-    # Import models dynamically based on expanded entities
-    from agent_poc.semantic_layer.generated_models.container import Container
-    from agent_poc.semantic_layer.generated_models.shipment import Shipment
-    from agent_poc.semantic_layer.generated_models.facility import Facility
-    from agent_poc.semantic_layer.generated_models.containerevent import Containerevent
-    from agent_poc.semantic_layer.generated_models.city import City
-
-    model_mapping = {
-        "Container": Container,
-        "Shipment": Shipment,
-        "Facility": Facility,
-        "ContainerEvent": Containerevent,
-        "City": City,
-    }
-
-    # Only include models for expanded entities
-    models = {
-        name: model_cls
-        for name, model_cls in model_mapping.items()
-        if name in expanded_entities
-    }
-    model_schemas = models_to_dict(models)
-
     # Step 3.5: Generate execution plan
     planner_result = planner(
         query=query,
@@ -131,6 +225,121 @@ def run_planning(
     return plan_steps, python_code
 
 
+async def arun_planning(
+    query: str,
+    intent: str,
+    extracted_entities: List[dict],
+    expanded_entities: List[str],
+    active_relations: List[RelationKey],
+    planner: TypeAwarePlanner | None = None,
+    codegen: PythonCodeGen | None = None,
+    compact_schemas: bool = False,
+    speculative: bool = False,
+) -> Tuple[List[Dict[str, Any]], str]:
+    """
+    Async variant of run_planning for callers that already run an event loop.
+
+    Tool collection and schema preparation run concurrently in worker threads,
+    and the blocking planner/codegen LLM calls are offloaded as well, so
+    several queries can be planned on one event loop.
+
+    With speculative=True, code for the skeleton of the last plan seen for the
+    same intent (literal inputs replaced by placeholders) is generated while
+    the planner runs. If the new plan has the same skeleton, its literals are
+    filled into that code; otherwise code is generated for the new plan. The
+    mispredicted codegen call cannot be interrupted, but its result stays in
+    the codegen cache for later plans of that skeleton.
+    """
+
+    if not extracted_entities or not expanded_entities:
+        return [], ""
+
+    planner = planner or _get_default_planner()
+    codegen = codegen or _get_default_codegen()
+
+    (
+        candidate_tools,
+        (entity_schemas, relation_schemas, model_schemas),
+    ) = await asyncio.gather(
+        asyncio.to_thread(
+            _collect_candidate_tools, expanded_entities, active_relations
+        ),
+        asyncio.to_thread(
+            _prepare_schemas, expanded_entities, active_relations, compact_schemas
+        ),
+    )
+    tools_dict = {tool["name"]: tool for tool in candidate_tools}
+
+    # Step 3.6 (speculative): start codegen for the predicted skeleton right away
+    predicted_skeleton = _PLAN_SKELETONS.get(intent) if speculative else None
+    speculative_task = None
+    if predicted_skeleton is not None:
+        speculative_task = asyncio.ensure_future(
+            asyncio.to_thread(
+                codegen,
+                plan=predicted_skeleton,
+                tools=tools_dict,
+                model_schemas=model_schemas,
+            )
+        )
+
+    try:
+        # Step 3.5: Generate execution plan
+        planner_result = await asyncio.to_thread(
+            planner,
+            query=query,
+            intent=intent,
+            extracted_entities=extracted_entities,
+            candidate_tools=candidate_tools,
+            entity_schemas=entity_schemas,
+            relations=relation_schemas,
+            model_schemas=model_schemas,
+        )
+
+        plan_steps = planner_result["steps"]
+        python_code = None
+        if speculative:
+            skeleton, literals = plan_skeleton(plan_steps)
+            _PLAN_SKELETONS.put(intent, skeleton)
+            if speculative_task is not None and skeleton == predicted_skeleton:
+                try:
+                    speculative_result = await speculative_task
+                    python_code = fill_skeleton_code(
+                        speculative_result["python_code"], literals
+                    )
+                except (AdapterParseError, ValueError):
+                    # Malformed or invalid generated code; anything else (LM,
+                    # network) would fail again below, so it propagates
+                    logger.warning(
+                        "Speculative code generation failed; generating for "
+                        "the actual plan",
+                        exc_info=True,
+                    )
+                    python_code = None
+
+        # Step 3.6: Generate Python code from plan
+        if python_code is None:
+            codegen_result = await asyncio.to_thread(
+                codegen,
+                plan=plan_steps,
+                tools=tools_dict,
+                model_schemas=model_schemas,
+            )
+            python_code = codegen_result["python_code"]
+    finally:
+        if speculative_task is not None:
+            # Not awaited on a mispredict or planner error; retrieve its
+            # outcome so a failure is not reported as never retrieved
+            speculative_task.add_done_callback(_discard_task_result)
+
+    return plan_steps, python_code
+
+
+def _discard_task_result(task: asyncio.Future) -> None:
+    if not task.cancelled():
+        task.exception()
+
+
 if __name__ == "__main__":
     from agent_poc.utils.dspy_helper import DspyHelper
     from agent_poc.modules.query_understanding.query_understanding import (
@@ -140,7 +349,7 @@ if __name__ == "__main__":
     from agent_poc.modules.semantic_grounding.relation_filtering import (
         RelationFiltering,
     )
-    from agent_poc.semantic_layer.engine import semantic_layer, ontology_entities
+    from agent_poc.semantic_layer.engine import semantic_layer, ontology_entities_json
     import agent_poc.utils.mlflow_helper as mlfow_helper
 
     import json
@@ -166,13 +375,13 @@ if __name__ == "__main__":
     print("Step 1: Query Understanding")
     print("-" * 80)
 
-    query_understanding = QueryUnderstanding(ontology_entities)
+    query_understanding = QueryUnderstanding()
     query_understanding.load(
         "src/agent_poc/modules/query_understanding/query_understanding_optimized_2.json"
     )
 
     qu_result = query_understanding(
-        query=sample_query, ontology_entities=ontology_entities
+        query=sample_query, ontology_entities=ontology_entities_json
     )
 
     print("\nExtracted entities:")
@@ -187,7 +396,7 @@ if __name__ == "__main__":
     print("Step 2: Semantic Grounding")
     print("-" * 80)
 
-    filtering_model = RelationFiltering(batch_size=4)
+    filtering_model = RelationFiltering()
     expanded_entities, active_relations = run_semantic_grounding(
         query=sample_query,
         entities=qu_result.entities,
@@ -0,0 +1,122 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from agent_poc.utils.semantic_cache import SemanticCache
+
+# Stands in for the i-th literal input of a plan skeleton
+_LITERAL_PLACEHOLDER = "__literal_{}__"
+# Head of an input value that references a step output: "<var>", "<var>.f", "<var>[*].f"
+_REFERENCE_HEAD = re.compile(r"[.\[]")
+
+
+class PlanTemplateCache(SemanticCache):
+    """
+    Plans from earlier queries, reusable as templates for similar queries.
+
+    Entries are bucketed by (intent, candidate tool names), since a template is
+    only valid against the same tool set, and matched within a bucket by
+    similarity of the query text. Templates do not expire. Literals (cities,
+    dates, IDs) may differ, since the template is adapted to the new query.
+    """
+
+    def __init__(self, threshold: float = 0.8, max_entries: int = 256) -> None:
+        super().__init__(
+            threshold=threshold,
+            ttl=None,
+            max_entries=max_entries,
+            exact_literals=False,
+        )
+
+    def lookup(
+        self, query: str, intent: str, tool_names: Iterable[str]
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Return the steps of the most similar cached plan above the threshold."""
+        return self.get(query, (intent, frozenset(tool_names)))
+
+    def add(
+        self,
+        query: str,
+        intent: str,
+        tool_names: Iterable[str],
+        steps: List[Dict[str, Any]],
+    ) -> None:
+        """Store a successful plan; the oldest entry is evicted when full."""
+        self.put(query, steps, (intent, frozenset(tool_names)))
+
+
+def plan_skeleton(
+    steps: List[Dict[str, Any]],
+) -> Tuple[List[Dict[str, Any]], List[Any]]:
+    """
+    The plan with every literal input replaced by a numbered placeholder, and
+    the literals in placeholder order.
+
+    Inputs that reference an earlier step's output are part of the structure
+    and kept as they are, so two plans that only differ in the values taken
+    from the query share a skeleton.
+    """
+    outputs = set()
+    literals: List[Any] = []
+    skeleton = []
+    for step in steps:
+        inputs = {}
+        for name, value in (step.get("inputs") or {}).items():
+            if isinstance(value, str) and _REFERENCE_HEAD.split(value, 1)[0] in outputs:
+                inputs[name] = value
+            else:
+                inputs[name] = _LITERAL_PLACEHOLDER.format(len(literals))
+                literals.append(value)
+        skeleton.append({**step, "inputs": inputs})
+        outputs.add(step.get("output"))
+    return skeleton, literals
+
+
+def fill_skeleton_code(code: str, literals: Sequence[Any]) -> Optional[str]:
+    """
+    Code generated for a plan skeleton, with each quoted placeholder replaced by
+    the repr of its literal; None if any placeholder is not found as a quoted
+    string (the code cannot be reused safely then).
+    """
+    for i, literal in enumerate(literals):
+        placeholder = re.escape(_LITERAL_PLACEHOLDER.format(i))
+        # a function replacement, so the repr is not parsed for backreferences
+        code, count = re.subn(
+            rf"(['\"]){placeholder}\1", lambda _, v=literal: repr(v), code
+        )
+        if not count:
+            return None
+    return code
+
+
+class PlanSkeletonCache:
+    """
+    The plan skeleton last produced per intent, used as the prediction for
+    speculative code generation.
+
+    Keyed by the LLM's free-text intent, so it is bounded: the least recently
+    used intent is evicted beyond `max_entries`. Safe to share across threads.
+    """
+
+    def __init__(self, max_entries: int = 256) -> None:
+        self.max_entries = max_entries
+        self._skeletons: OrderedDict[str, List[Dict[str, Any]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._skeletons)
+
+    def get(self, intent: str) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            skeleton = self._skeletons.get(intent)
+            if skeleton is not None:
+                self._skeletons.move_to_end(intent)
+            return skeleton
+
+    def put(self, intent: str, skeleton: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._skeletons[intent] = skeleton
+            self._skeletons.move_to_end(intent)
+            while len(self._skeletons) > self.max_entries:
+                self._skeletons.popitem(last=False)
@@ -1,6 +1,18 @@
-from typing import List, Dict
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Dict, Optional
 import dspy
 
+from agent_poc.modules.planning.plan_cache import PlanTemplateCache
+from agent_poc.modules.planning.plan_schema import validate_steps
+from agent_poc.modules.planning.schema_converters import (
+    relation_sort_key,
+    topo_sort_tools,
+)
+from agent_poc.utils.concurrency import submit_in_context
+from agent_poc.utils.canonical import canonicalize, sort_items
+from agent_poc.utils.llm_cache import StateFingerprint, cache_llm
+
 
 class SemanticTodoPlannerSignature(dspy.Signature):
     """
@@ -70,6 +82,220 @@ class SemanticTodoPlanner(dspy.Module):
         )
 
 
+class TypeAwarePlanSignature(dspy.Signature):
+    """
+    Produce a tool-call execution plan that answers the user's query.
+
+    Rules:
+    - Use only `candidate_tools`, with their exact `input_schema` parameter names.
+    - One tool call per step; `output` is a unique, valid Python variable name.
+    - Consume a previous output only if its type (`output_type`, `model_schemas`)
+      has the needed field; navigate via `relations` / `entity_schemas`.
+    - Use the fewest steps. Copy query literals exactly; enums come from schemas.
+    - Dates are "YYYY-MM-DD" (a single day is both start_date and end_date),
+      never ISO8601 timestamps.
+    - Per-item calls over a list output use "<var>[*].<field>"; a single
+      object's field is "<var>.<field>".
+
+    steps: [{"id": int (1-based), "tool": str,
+             "inputs": {param: literal_or_var_or_fieldpath}, "output": str}]
+    """
+
+    # Inputs render in declaration order: the large, mostly static schema blocks
+    # go first so providers can reuse the cached prompt prefix across queries.
+    model_schemas: Dict[str, Any] = dspy.InputField(
+        desc="JSON schemas of the Pydantic models returned by the tools."
+    )
+    entity_schemas: List[Dict[str, Any]] = dspy.InputField(
+        desc="Ontology entities involved, with their relationships."
+    )
+    relations: List[Dict[str, Any]] = dspy.InputField(
+        desc="Active ontology relations (name, from_entity, to_entity)."
+    )
+    candidate_tools: List[Dict[str, Any]] = dspy.InputField(
+        desc=(
+            "Tools that may be used, in dependency order, with input_schema, "
+            "output_type and depends_on (tools whose output can feed them)."
+        )
+    )
+    query: str = dspy.InputField(desc="User's natural language query.")
+    intent: str = dspy.InputField(desc="High-level intent from query understanding.")
+    extracted_entities: List[Dict[str, Any]] = dspy.InputField(
+        desc="Entities extracted from the query, each with 'type' and 'value'."
+    )
+
+    steps: List[Dict[str, Any]] = dspy.OutputField(
+        desc="Ordered tool-call steps with id, tool, inputs and output."
+    )
+
+
+class AdaptPlanSignature(dspy.Signature):
+    """
+    Adapt a tool-call plan written for a similar earlier query to a new query.
+
+    Keep the same tools, step order and output variable names. Only replace
+    literal input values (names, identifiers, dates as "YYYY-MM-DD") with the
+    ones from the new query and its extracted entities. Field references such
+    as "terminals[*].facility_id" are kept unchanged.
+    """
+
+    query: str = dspy.InputField(desc="User's natural language query.")
+    extracted_entities: List[Dict[str, Any]] = dspy.InputField(
+        desc="Entities extracted from the query, each with 'type' and 'value'."
+    )
+    template_steps: List[Dict[str, Any]] = dspy.InputField(
+        desc="Plan steps produced for a similar earlier query."
+    )
+
+    steps: List[Dict[str, Any]] = dspy.OutputField(
+        desc="The template steps with literals adapted to the query."
+    )
+
+
+class TypeAwarePlanner(dspy.Module):
+    """
+    Step 3: Plan which typed semantic-layer tools to call, and in which order.
+
+    Usage:
+        planner = TypeAwarePlanner()
+        result = planner(query=..., intent=..., extracted_entities=...,
+                         candidate_tools=..., entity_schemas=..., relations=...,
+                         model_schemas=...)
+        plan_steps = result["steps"]
+
+    chain_of_thought=False plans with a plain Predict call for lower latency.
+    Returned steps are checked against plan_schema.PLAN_SCHEMA (ValueError on
+    mismatch) unless validate_plan=False.
+
+    compiled_path loads a program saved by a DSPy optimizer (e.g. few-shot
+    demos distilled from full plans), like query_understanding_optimized.json.
+
+    Pass a PlanTemplateCache to reuse plans across similar queries: on a hit,
+    a cheap Predict call adapts the cached plan's literals instead of running
+    the full chain-of-thought planner.
+    """
+
+    def __init__(
+        self,
+        template_cache: Optional[PlanTemplateCache] = None,
+        compiled_path: Optional[str] = None,
+        chain_of_thought: bool = True,
+        validate_plan: bool = True,
+    ) -> None:
+        super().__init__()
+        self._validate_plan = validate_plan
+        # Without chain of thought the model emits the steps directly, skipping
+        # the reasoning field (roughly half the output tokens)
+        predictor = dspy.ChainOfThought if chain_of_thought else dspy.Predict
+        self._chain_of_thought = chain_of_thought
+        self.planner = predictor(TypeAwarePlanSignature)
+        self.adapter = dspy.Predict(AdaptPlanSignature)
+        self.template_cache = template_cache
+        # Keys persisted plans to the planner's instructions/demos
+        self._planner_state = StateFingerprint()
+
+        # Optimized program (demos/instructions) saved by a DSPy optimizer
+        if compiled_path:
+            self.load(compiled_path)
+
+    def forward(
+        self,
+        query: str,
+        intent: str,
+        extracted_entities: List[Dict[str, Any]],
+        candidate_tools: List[Dict[str, Any]],
+        entity_schemas: List[Dict[str, Any]] | str,
+        relations: List[Dict[str, Any]] | str,
+        model_schemas: Dict[str, Any] | str,
+    ) -> Dict[str, Any]:
+        tool_names = [t["name"] for t in candidate_tools]
+        if self.template_cache is not None:
+            template = self.template_cache.lookup(query, intent, tool_names)
+            if template is not None:
+                result = self.adapter(
+                    query=query,
+                    extracted_entities=canonicalize(extracted_entities),
+                    template_steps=template,
+                )
+                return {"steps": self._checked(result.steps)}
+
+        # Canonicalize order-insensitive inputs so equivalent requests render
+        # byte-identical prompts and hit DSPy's LM cache
+        steps = self._plan(
+            planner_state=self._planner_state(self.planner),
+            chain_of_thought=self._chain_of_thought,
+            query=query,
+            intent=intent,
+            extracted_entities=canonicalize(extracted_entities),
+            # Name order makes the input canonical; topo order then lists
+            # producers before the tools that consume their output
+            candidate_tools=topo_sort_tools(sort_items(candidate_tools)),
+            # Pre-serialized JSON (see pipeline._prepare_schemas) is passed
+            # through verbatim; it is already in canonical order
+            entity_schemas=(
+                entity_schemas
+                if isinstance(entity_schemas, str)
+                else sort_items(entity_schemas)
+            ),
+            relations=(
+                relations
+                if isinstance(relations, str)
+                else sort_items(relations, key=relation_sort_key)
+            ),
+            model_schemas=canonicalize(model_schemas),
+        )
+        steps = self._checked(steps)
+        if self.template_cache is not None and steps:
+            self.template_cache.add(query, intent, tool_names, steps)
+        return {"steps": steps}
+
+    def _checked(self, steps: Any) -> List[Dict[str, Any]]:
+        """Validate the step structure so malformed plans fail before codegen."""
+        return validate_steps(steps) if self._validate_plan else steps
+
+    def forward_many(
+        self, items: List[Dict[str, Any]], num_threads: int = 8
+    ) -> List[Dict[str, Any]]:
+        """
+        Plan a batch of independent queries concurrently; results keep input order.
+
+        Each item holds the keyword arguments of forward(). Planning is bound by
+        LLM round-trips, so threads overlap the waits; num_threads caps how many
+        requests are in flight at once.
+        """
+        with ThreadPoolExecutor(max_workers=num_threads) as pool:
+            futures = [submit_in_context(pool, self, **item) for item in items]
+            return [f.result() for f in futures]
+
+    async def forward_batch(
+        self, items: List[Dict[str, Any]], max_concurrent: int = 8
+    ) -> List[Dict[str, Any]]:
+        """Async forward_many: at most max_concurrent planner calls run at a time."""
+        semaphore = asyncio.Semaphore(max_concurrent)
+
+        async def plan_one(item: Dict[str, Any]) -> Dict[str, Any]:
+            async with semaphore:
+                return await asyncio.to_thread(self, **item)
+
+        return await asyncio.gather(*(plan_one(item) for item in items))
+
+    def load_state(self, state):
+        self._planner_state.reset()
+        return super().load_state(state)
+
+    @cache_llm("planner")
+    def _plan(
+        self, *, planner_state: str, chain_of_thought: bool, **inputs: Any
+    ) -> List[Dict[str, Any]]:
+        """
+        Run the planner predictor and return only its plan steps.
+
+        `planner_state` and `chain_of_thought` are not used by the call; they
+        key the cache entry to this planner's program and mode.
+        """
+        return self.planner(**inputs).steps
+
+
 if __name__ == "__main__":
     from agent_poc.utils.dspy_helper import DspyHelper
 
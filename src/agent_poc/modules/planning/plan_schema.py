@@ -0,0 +1,50 @@
+from typing import Any, Dict, List
+
+try:
+    import fastjsonschema
+except ImportError:  # optional; fall back to the jsonschema package
+    fastjsonschema = None
+    from jsonschema import Draft202012Validator
+
+PLAN_STEP_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "required": ["id", "tool", "inputs", "output"],
+    "properties": {
+        "id": {"type": "integer"},
+        "tool": {"type": "string", "minLength": 1},
+        "inputs": {"type": "object"},
+        "output": {"type": "string", "pattern": r"^[A-Za-z_][A-Za-z0-9_]*$"},
+    },
+}
+
+PLAN_SCHEMA: Dict[str, Any] = {"type": "array", "items": PLAN_STEP_SCHEMA}
+
+# Compiled once at import: fastjsonschema generates a Python function for the
+# schema; jsonschema checks the schema once and reuses the validator.
+if fastjsonschema is not None:
+    _validate = fastjsonschema.compile(PLAN_SCHEMA)
+
+    def _first_error(steps: Any) -> str | None:
+        try:
+            _validate(steps)
+        except fastjsonschema.JsonSchemaException as exc:
+            return exc.message
+        return None
+
+else:
+    _VALIDATOR = Draft202012Validator(PLAN_SCHEMA)
+
+    def _first_error(steps: Any) -> str | None:
+        error = next(_VALIDATOR.iter_errors(steps), None)
+        if error is None:
+            return None
+        path = "".join(f"[{p!r}]" for p in error.absolute_path)
+        return f"steps{path}: {error.message}"
+
+
+def validate_steps(steps: Any) -> List[Dict[str, Any]]:
+    """Check planner output against PLAN_SCHEMA; raise ValueError if it does not match."""
+    error = _first_error(steps)
+    if error is not None:
+        raise ValueError(f"Planner returned an invalid plan: {error}")
+    return steps
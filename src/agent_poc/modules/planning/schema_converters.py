@@ -2,97 +2,347 @@
 
 from __future__ import annotations
 
-from dataclasses import asdict
-from typing import Any, Dict, List, Iterable, Type
+import logging
+import re
+import weakref
+from collections import deque
+from functools import lru_cache
+from operator import attrgetter
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Iterable,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    TypeVar,
+)
 
 from pydantic import BaseModel
 
 from agent_poc.semantic_layer.engine import ToolInfo
+from agent_poc.utils.fast_json import dumps
 from agent_poc.semantic_layer.ontology import EntitySchema, RelationSchema
-from agent_poc.semantic_layer.generated_models.container import Container
-from agent_poc.semantic_layer.generated_models.facility import Facility
-from agent_poc.semantic_layer.generated_models.containerevent import Containerevent
+
+logger = logging.getLogger(__name__)
+
+_T = TypeVar("_T")
+_Memo = Dict[int, Tuple["weakref.ref[Any]", Dict[str, Any]]]
+
+# Converted tool/entity/relation dicts keyed by id() of the source object (the
+# dataclasses are unhashable). A weak reference is kept alongside so a recycled
+# id never matches, and a finalizer drops the entry once the object is gone,
+# e.g. after the ontology is reloaded.
+_TOOL_CACHE: _Memo = {}
+_ENTITY_CACHE: _Memo = {}
+_RELATION_CACHE: _Memo = {}
+
+_ENTITY_FIELDS = ("name", "description")
+_RELATION_FIELDS = ("name", "from_entity", "to_entity", "description")
+_get_entity_fields = attrgetter(*_ENTITY_FIELDS)
+_get_relation_fields = attrgetter(*_RELATION_FIELDS)
+
+
+def clear_schema_caches() -> None:
+    """Drop memoized tool/entity/relation dicts, e.g. after reloading the ontology."""
+    _TOOL_CACHE.clear()
+    _ENTITY_CACHE.clear()
+    _RELATION_CACHE.clear()
+
+
+def _memoized(
+    cache: _Memo, obj: _T, build: Callable[[_T], Dict[str, Any]]
+) -> Dict[str, Any]:
+    key = id(obj)
+    cached = cache.get(key)
+    if cached is not None and cached[0]() is obj:
+        return cached[1]
+
+    payload = build(obj)
+    cache[key] = (weakref.ref(obj), payload)
+    weakref.finalize(obj, cache.pop, key, None)
+    return payload
+
+
+def _tool_to_dict(t: ToolInfo) -> Dict[str, Any]:
+    return _memoized(_TOOL_CACHE, t, _build_tool_dict)
+
+
+def _build_tool_dict(t: ToolInfo) -> Dict[str, Any]:
+    # Pick fields explicitly instead of dataclasses.asdict: it deep-copies every
+    # nested value, and the handler is not serializable anyway (the planner only
+    # needs the schema, not execution).
+    return {
+        "name": t.name,
+        "description": t.description,
+        "input_schema": t.input_schema,
+        "output_type": t.output_type,
+        "kind": t.kind,
+        "associated_relation": t.associated_relation,
+        "associated_entity": t.associated_entity,
+    }
 
 
 def tools_to_dict(tools: Iterable[ToolInfo]) -> List[Dict[str, Any]]:
     """Convert ToolInfo dataclasses to JSON-serializable dicts for the planner."""
-    result: List[Dict[str, Any]] = []
-
-    for t in tools:
-        # ToolInfo is already a clean structure, use asdict directly
-        payload = asdict(t)
-        # Remove handler if it can't be serialized (planner only needs schema, not execution)
-        payload.pop("handler", None)
-        result.append(payload)
-
-    return result
-
-
-def entities_to_dict(entities: Iterable[EntitySchema]) -> List[Dict[str, Any]]:
-    out: List[Dict[str, Any]] = []
-    for e in entities:
-        out.append(
-            {
-                "name": e.name,
-                "description": e.description,
-                "synonyms": list(e.synonyms),
-                "relationships": {
-                    rel_name: {
-                        "target": rel_spec.target,
-                        "description": rel_spec.description,
-                    }
-                    for rel_name, rel_spec in e.relationships.items()
-                },
+    return [_tool_to_dict(t) for t in tools]
+
+
+# Capitalized identifiers in an output_type such as
+# "typing.List[agent_poc...containerevent.Containerevent]"
+_TYPE_NAME_RE = re.compile(r"\b[A-Z]\w*")
+
+
+def required_models(
+    tools: Iterable[Dict[str, Any]], entity_names: Iterable[str]
+) -> Set[str]:
+    """
+    Names of the models the planner may need: the given entities plus every
+    class named in a tool's output_type. Non-model names (e.g. "List") are
+    harmless; callers intersect the result with their model registry.
+    """
+    names = set(entity_names)
+    for tool in tools:
+        names.update(_TYPE_NAME_RE.findall(str(tool.get("output_type") or "")))
+    return names
+
+
+def _produced_entity(tool: Dict[str, Any]) -> Optional[str]:
+    if tool.get("kind") == "relation" and tool.get("associated_relation"):
+        return tool["associated_relation"][2]
+    return tool.get("associated_entity")
+
+
+def topo_sort_tools(
+    tools: List[Dict[str, Any]],
+    model_fields: Optional[Mapping[str, Iterable[str]]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Order tool dicts so producers come before the tools that consume their output.
+
+    Tool v depends on tool u if one of v's parameters is a field of the entity u
+    returns. Entity fields come from `model_fields` (entity name -> field names)
+    and default to the "<entity>_id" convention of the semantic layer tools.
+    Each returned dict is a copy with a "depends_on" list of tool names. Ties
+    keep the input order, as do tools on a dependency cycle (placed last).
+    """
+    fields_by_tool = []
+    for tool in tools:
+        entity = _produced_entity(tool)
+        if entity is None:
+            fields_by_tool.append(frozenset())
+        elif model_fields is not None and entity in model_fields:
+            fields_by_tool.append(frozenset(model_fields[entity]))
+        else:
+            fields_by_tool.append(frozenset({f"{entity.lower()}_id"}))
+
+    depends_on: List[List[int]] = [[] for _ in tools]
+    dependents: List[List[int]] = [[] for _ in tools]
+    for v, tool in enumerate(tools):
+        params = {p["name"] for p in tool.get("input_schema") or ()}
+        for u, produced in enumerate(fields_by_tool):
+            if u != v and params & produced:
+                depends_on[v].append(u)
+                dependents[u].append(v)
+
+    # Kahn's algorithm
+    in_degree = [len(deps) for deps in depends_on]
+    ready = deque(i for i, degree in enumerate(in_degree) if degree == 0)
+    order: List[int] = []
+    while ready:
+        u = ready.popleft()
+        order.append(u)
+        for v in dependents[u]:
+            in_degree[v] -= 1
+            if in_degree[v] == 0:
+                ready.append(v)
+
+    if len(order) < len(tools):
+        # Bidirectional relations (e.g. Container <-> Shipment) form cycles; the
+        # tools on them keep their input order after the acyclic prefix
+        logger.debug("Tool dependency cycle; appending remaining tools in order")
+        placed = set(order)
+        order.extend(i for i in range(len(tools)) if i not in placed)
+
+    return [
+        {**tools[i], "depends_on": [tools[u]["name"] for u in depends_on[i]]}
+        for i in order
+    ]
+
+
+def _entity_to_dict(e: EntitySchema) -> Dict[str, Any]:
+    return _memoized(_ENTITY_CACHE, e, _build_entity_dict)
+
+
+def _build_entity_dict(e: EntitySchema) -> Dict[str, Any]:
+    payload = dict(zip(_ENTITY_FIELDS, _get_entity_fields(e)))
+    payload.update(
+        synonyms=list(e.synonyms),
+        relationships={
+            rel_name: {
+                "target": rel_spec.target,
+                "description": rel_spec.description,
             }
-        )
-    return out
+            for rel_name, rel_spec in e.relationships.items()
+        },
+    )
+    return payload
+
+
+def _relation_to_dict(r: RelationSchema) -> Dict[str, Any]:
+    return _memoized(_RELATION_CACHE, r, _build_relation_dict)
+
+
+def _build_relation_dict(r: RelationSchema) -> Dict[str, Any]:
+    return dict(zip(_RELATION_FIELDS, _get_relation_fields(r)))
+
+
+def _compress_entity(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Keep only what the planner needs to navigate: name and relationships."""
+    return {"name": payload["name"], "relationships": payload["relationships"]}
+
+
+def entities_to_dict(
+    entities: Iterable[EntitySchema], compact: bool = False
+) -> List[Dict[str, Any]]:
+    if compact:
+        return [_compress_entity(_entity_to_dict(e)) for e in entities]
+    return [_entity_to_dict(e) for e in entities]
 
 
 def relations_to_dict(relations: Iterable[RelationSchema]) -> List[Dict[str, Any]]:
-    out: List[Dict[str, Any]] = []
-    for r in relations:
-        out.append(
-            {
-                "name": r.name,
-                "from_entity": r.from_entity,
-                "to_entity": r.to_entity,
-                "description": r.description,
-            }
-        )
-    return out
+    return [_relation_to_dict(r) for r in relations]
+
+
+def relation_sort_key(relation: Dict[str, Any]) -> Tuple[str, str, str]:
+    """Canonical order of relation dicts: (from_entity, name, to_entity)."""
+    return (relation["from_entity"], relation["name"], relation["to_entity"])
 
 
 def normalize_model_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
     """
     Remove 'format: date-time' to prevent LLM from outputting ISO8601 timestamps.
     Keep the fact that the field is a string, but not the date-time format.
+
+    Walks the whole schema (nested objects, anyOf for Optional fields, array
+    items, $defs) iteratively and modifies it in place.
     """
-    if "properties" in schema:
-        for prop_name, prop_schema in schema["properties"].items():
-            if prop_schema.get("format") == "date-time":
-                prop_schema.pop("format", None)
+    stack: List[Any] = [schema]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            if node.get("format") == "date-time":
+                del node["format"]
+            children = node.values()
+        else:
+            children = node
+        # Only containers go on the stack; scalar leaves are skipped right away
+        stack.extend(c for c in children if isinstance(c, (dict, list)))
     return schema
 
 
-def models_to_dict(models: Dict[str, Type[BaseModel]]) -> Dict[str, Dict[str, Any]]:
+_VERBOSE_SCHEMA_KEYS = frozenset({"title", "description", "examples", "$defs"})
+_DEFS_REF_PREFIX = "#/$defs/"
+
+
+def compact_model_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Return a prompt-sized copy of a model JSON schema.
+
+    Drops 'title', 'description', 'examples' and boolean 'additionalProperties'
+    at every level and inlines local '$ref's so '$defs' can be removed.
+    Property names themselves are never dropped, even if a field is called e.g. 'description'.
+    """
+    defs = schema.get("$defs", {})
+
+    def walk(node: Any, expanding: Tuple[str, ...] = ()) -> Any:
+        if isinstance(node, list):
+            return [walk(item, expanding) for item in node]
+        if not isinstance(node, dict):
+            return node
+
+        out: Dict[str, Any] = {}
+        ref = node.get("$ref")
+        if isinstance(ref, str) and ref.startswith(_DEFS_REF_PREFIX):
+            def_name = ref[len(_DEFS_REF_PREFIX) :]
+            # Leave recursive references in place instead of looping forever
+            if def_name in defs and def_name not in expanding:
+                out.update(walk(defs[def_name], expanding + (def_name,)))
+                node = {k: v for k, v in node.items() if k != "$ref"}
+
+        for key, value in node.items():
+            if key in _VERBOSE_SCHEMA_KEYS:
+                continue
+            # A bool only toggles extra keys; a schema value (Dict[str, X]) is kept
+            if key == "additionalProperties" and isinstance(value, bool):
+                continue
+            if key == "properties" and isinstance(value, dict):
+                out[key] = {
+                    prop: walk(prop_schema, expanding)
+                    for prop, prop_schema in value.items()
+                }
+            else:
+                out[key] = walk(value, expanding)
+        return out
+
+    return walk(schema)
+
+
+@lru_cache(maxsize=None)
+def _schema_for(model_cls: Type[BaseModel], compact: bool = False) -> Dict[str, Any]:
+    """
+    Build the normalized JSON schema for a Pydantic model once per class.
+
+    Generated models are static for the lifetime of the process, so the result
+    is cached and shared between callers; treat it as read-only.
+    """
+    if compact:
+        return compact_model_schema(_schema_for(model_cls))
+    return normalize_model_schema(model_cls.model_json_schema())
+
+
+def models_to_dict(
+    models: Dict[str, Type[BaseModel]], compact: bool = False
+) -> Dict[str, Dict[str, Any]]:
     """
     Convert Pydantic models into a compact json schema dict for the planner.
 
     models: mapping from entity_name → Pydantic class
+    compact: strip titles/descriptions/examples and inline $defs to shrink the prompt
+    """
+    return {name: _schema_for(model_cls, compact) for name, model_cls in models.items()}
+
+
+@lru_cache(maxsize=None)
+def model_schema_json(model_cls: Type[BaseModel], compact: bool = False) -> str:
+    """JSON text of the normalized model schema, serialized once per class."""
+    return dumps(_schema_for(model_cls, compact))
+
+
+def models_to_json(models: Dict[str, Type[BaseModel]], compact: bool = False) -> str:
     """
-    out: Dict[str, Dict[str, Any]] = {}
-    for name, model_cls in models.items():
-        schema = model_cls.model_json_schema()
-        # Can simplify/rename fields if needed, for now pass as-is to planner
-        out[name] = schema
+    Same content as models_to_dict, pre-serialized as a JSON object string.
 
-    model_schemas = {k: normalize_model_schema(v) for k, v in out.items()}
-    return model_schemas
+    DSPy passes string inputs through verbatim, so handing it this string
+    avoids re-encoding the (static) model schemas on every planner/codegen call.
+    """
+    fields = (
+        f"{dumps(name)}:{model_schema_json(model_cls, compact)}"
+        for name, model_cls in models.items()
+    )
+    return "{" + ",".join(fields) + "}"
 
 
 if __name__ == "__main__":
     import json
     from agent_poc.semantic_layer.engine import semantic_layer
+    from agent_poc.semantic_layer.generated_models.container import Container
+    from agent_poc.semantic_layer.generated_models.facility import Facility
+    from agent_poc.semantic_layer.generated_models.containerevent import Containerevent
 
     print("=" * 80)
     print("Adapters Module Demo")
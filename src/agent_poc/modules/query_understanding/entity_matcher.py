@@ -0,0 +1,85 @@
+import re
+from typing import Dict, Iterable, List, Mapping, Optional
+
+from agent_poc.semantic_layer.ontology import EntitySchema
+
+# Identifier formats that name an entity on their own
+DEFAULT_ID_PATTERNS: Mapping[str, str] = {
+    "Container": r"\b[A-Z]{4}\d{7}\b",  # ISO 6346 container number
+}
+
+# Words that carry no entity information and are ignored for coverage
+_STOPWORDS = frozenset(
+    "a an and are at by for from how in is it many me my of on or show the "
+    "there to was were what when where which who with".split()
+)
+_TOKEN = re.compile(r"\w+")
+
+
+class EntityMatcher:
+    """
+    Literal detection of ontology entity mentions in a query.
+
+    All surface forms (entity names and synonyms, with optional plural "s") are
+    compiled into a single alternation regex, so a query is scanned once
+    regardless of the ontology size; identifier patterns (e.g. container
+    numbers) are matched alongside.
+    """
+
+    def __init__(
+        self,
+        surface_forms: Mapping[str, str],
+        id_patterns: Optional[Mapping[str, str]] = None,
+    ) -> None:
+        # Longest forms first so "container event" wins over "container"
+        forms = sorted(surface_forms, key=len, reverse=True)
+        self._entity_by_form: Dict[str, str] = {
+            form.lower(): surface_forms[form] for form in forms
+        }
+        alternation = "|".join(re.escape(form) for form in forms) or r"(?!)"
+        self._forms = re.compile(rf"\b({alternation})s?\b", re.IGNORECASE)
+        self._ids = [
+            (re.compile(pattern), entity)
+            for entity, pattern in (id_patterns or {}).items()
+        ]
+
+    @classmethod
+    def from_entities(
+        cls,
+        entities: Iterable[EntitySchema],
+        id_patterns: Optional[Mapping[str, str]] = DEFAULT_ID_PATTERNS,
+    ) -> "EntityMatcher":
+        surface_forms: Dict[str, str] = {}
+        for entity in entities:
+            # "ContainerEvent" -> "container event"
+            spaced = re.sub(r"(?<=[a-z])(?=[A-Z])", " ", entity.name)
+            for form in (entity.name, spaced, *entity.synonyms):
+                surface_forms.setdefault(form.replace("_", " ").lower(), entity.name)
+        return cls(surface_forms, id_patterns)
+
+    def _spans(self, query: str) -> List[tuple]:
+        spans = [
+            (m.start(), m.end(), self._entity_by_form[m.group(1).lower()])
+            for m in self._forms.finditer(query)
+        ]
+        for pattern, entity in self._ids:
+            spans.extend((m.start(), m.end(), entity) for m in pattern.finditer(query))
+        return sorted(spans)
+
+    def match(self, query: str) -> List[str]:
+        """Entity names mentioned in the query, in order of first mention."""
+        return list(dict.fromkeys(entity for _, _, entity in self._spans(query)))
+
+    def coverage(self, query: str) -> float:
+        """Share of the query's content words that are part of an entity mention."""
+        spans = self._spans(query)
+        words = [
+            m for m in _TOKEN.finditer(query) if m.group().lower() not in _STOPWORDS
+        ]
+        if not words:
+            return 0.0
+        covered = sum(
+            any(start <= w.start() and w.end() <= end for start, end, _ in spans)
+            for w in words
+        )
+        return covered / len(words)
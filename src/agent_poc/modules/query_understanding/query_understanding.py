@@ -1,6 +1,16 @@
-from typing import List, Tuple
+import copy
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 import dspy
 
+from agent_poc.modules.query_understanding.entity_matcher import EntityMatcher
+from agent_poc.semantic_layer.engine import ontology_entities_json
+from agent_poc.utils.fast_json import dumps
+from agent_poc.utils.llm_cache import StateFingerprint, cache_llm
+from agent_poc.utils.semantic_cache import SemanticCache
+
 
 # ------------------------------------------------------------
 # Step 1 Signature
@@ -13,8 +23,8 @@ class QueryUnderstandingSignature(dspy.Signature):
     # ---- Inputs ----
     query: str = dspy.InputField(desc="User's natural language query.")
 
-    ontology_entities: List[Tuple[str, str]] = dspy.InputField(
-        desc=("A list of ontology entity tuples in the form (EntityName, Description).")
+    ontology_entities: str = dspy.InputField(
+        desc="JSON array of ontology entities, each [EntityName, Description]."
     )
 
     # ---- Outputs ----
@@ -33,22 +43,207 @@ class QueryUnderstandingSignature(dspy.Signature):
 # Step 1 DSPy Module
 # ------------------------------------------------------------
 class QueryUnderstanding(dspy.Module):
-    def __init__(self):
+    def __init__(
+        self,
+        *,
+        cache_size: int = 256,
+        semantic_cache: Optional[SemanticCache] = None,
+        entity_matcher: Optional[EntityMatcher] = None,
+        min_coverage: float = 0.6,
+    ):
         """Initialize module with a canonical ontology entity description list."""
         super().__init__()
         self.predict = dspy.Predict(QueryUnderstandingSignature)
 
+        # Exact-match LRU of predictions; 0 disables it. Guarded by a lock as
+        # the module is called from batch/evaluation worker threads
+        self._cache: OrderedDict[Tuple[Any, ...], dspy.Prediction] = OrderedDict()
+        self._cache_size = cache_size
+        self._cache_lock = threading.Lock()
+        # Optional near-duplicate cache (e.g. same query with other casing)
+        self.semantic_cache = semantic_cache
+        # Optional literal entity detection: when the query is mostly made of
+        # entity mentions, only those entities are offered to the LLM
+        self.entity_matcher = entity_matcher
+        self.min_coverage = min_coverage
+
+        # Serialized predictor state, part of every cache key
+        self._state_fingerprint = StateFingerprint()
+
     def forward(
         self,
         query: str,
-        ontology_entities: List[str],
+        ontology_entities: Optional[Union[str, Sequence[Tuple[str, str]]]] = None,
     ) -> QueryUnderstandingSignature:
-        """Allow DSPy evaluators/optimizers to override ontology_entities per example."""
+        """
+        Allow DSPy evaluators/optimizers to override ontology_entities per example.
+
+        ontology_entities is the (name, description) list or its pre-rendered
+        compact JSON form; it defaults to the semantic layer's ontology
+        (`engine.ontology_entities_json`), so examples only need a query.
+        """
+        if ontology_entities is None:
+            ontology_entities = ontology_entities_json
+        if self.entity_matcher is not None:
+            ontology_entities = self._narrow_ontology(query, ontology_entities)
+        if not isinstance(ontology_entities, str):
+            # One compact JSON table rather than DSPy's spaced rendering
+            ontology_entities = dumps(ontology_entities)
+
+        if not self._cache_size and self.semantic_cache is None:
+            return self.predict(query=query, ontology_entities=ontology_entities)
+
+        # The predictor state (instructions, demos) is part of the key so that
+        # optimizer candidates never share each other's predictions
+        state = self._state_fingerprint(self.predict)
+        key = (query, ontology_entities, state)
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+        if cached is not None:
+            # Cached predictions are shared; callers get their own copy
+            cached = _copy_prediction(cached)
+            # Record the call like Predict does, so bootstrapping still sees it
+            if dspy.settings.trace is not None:
+                dspy.settings.trace.append(
+                    (
+                        self.predict,
+                        {"query": query, "ontology_entities": ontology_entities},
+                        cached,
+                    )
+                )
+            return cached
+
+        bucket = key[1:]
+        result = None
+        if self.semantic_cache is not None:
+            result = self.semantic_cache.get(query, bucket)
+        if result is None:
+            result = self._predict(
+                query=query, ontology_entities=ontology_entities, state=state
+            )
+            if self.semantic_cache is not None:
+                self.semantic_cache.put(query, result, bucket)
+
+        if not self._cache_size:
+            return _copy_prediction(result)
+        with self._cache_lock:
+            self._cache[key] = result
+            self._cache.move_to_end(key)
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return _copy_prediction(result)
+
+    def load_state(self, state):
+        self._state_fingerprint.reset()
+        return super().load_state(state)
+
+    def __getstate__(self):
+        # Locks cannot be copied; module.deepcopy() and pickling get a new one
+        state = super().__getstate__()
+        state.pop("_cache_lock", None)
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self._cache_lock = threading.Lock()
+
+    def _narrow_ontology(
+        self, query: str, ontology_entities: Union[str, Sequence[Tuple[str, str]]]
+    ) -> Union[str, Sequence[Tuple[str, str]]]:
+        """The literally mentioned entities, if they cover enough of the query."""
+        if self.entity_matcher.coverage(query) < self.min_coverage:
+            return ontology_entities
+        mentioned = set(self.entity_matcher.match(query))
+        entries = (
+            json.loads(ontology_entities)
+            if isinstance(ontology_entities, str)
+            else ontology_entities
+        )
+        narrowed = [e for e in entries if e[0] in mentioned]
+        return narrowed or ontology_entities
+
+    @cache_llm("query_understanding")
+    def _predict(
+        self, *, query: str, ontology_entities: str, state: str
+    ) -> dspy.Prediction:
+        """
+        Predict entities and intent; `state` is not used by the call, it only
+        keys the cache entry to the predictor state.
+        """
         return self.predict(query=query, ontology_entities=ontology_entities)
 
 
+def _copy_prediction(pred: dspy.Prediction) -> dspy.Prediction:
+    """A copy of a cached prediction that callers can modify freely."""
+    return dspy.Prediction(**copy.deepcopy(dict(pred.items())))
+
+
+class BulkQueryUnderstandingSignature(dspy.Signature):
+    """
+    Step 1 for several queries at once: extract related entities + high-level
+    intent for each query.
+    """
+
+    queries: List[str] = dspy.InputField(desc="User queries in natural language.")
+
+    ontology_entities: str = dspy.InputField(
+        desc="JSON array of ontology entities, each [EntityName, Description]."
+    )
+
+    results: List[Dict[str, Any]] = dspy.OutputField(
+        desc=(
+            "One result per query, in order: {'entities': [EntityName, ...], "
+            "'intent': short intent label of less than 8 words}. "
+            "Entities must come from the ontology_entities."
+        )
+    )
+
+
+class BulkQueryUnderstanding(dspy.Module):
+    """
+    Query understanding for a whole set of queries in one LLM call.
+
+    Meant for evaluation runs, where one round-trip beats one per query;
+    requests from users go through `QueryUnderstanding`. The prompt differs from
+    the single-query one, so optimized demos/instructions do not carry over.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.predict = dspy.Predict(BulkQueryUnderstandingSignature)
+
+    def forward(
+        self,
+        queries: List[str],
+        ontology_entities: Optional[Union[str, Sequence[Tuple[str, str]]]] = None,
+    ) -> List[dspy.Prediction]:
+        """
+        One prediction (entities, intent) per query, in order.
+
+        Raises ValueError if the LLM does not return one result per query.
+        """
+        if ontology_entities is None:
+            ontology_entities = ontology_entities_json
+        if not isinstance(ontology_entities, str):
+            ontology_entities = dumps(ontology_entities)
+
+        results = self.predict(
+            queries=list(queries), ontology_entities=ontology_entities
+        ).results
+        if len(results) != len(queries):
+            raise ValueError(f"Expected {len(queries)} results, got {len(results)}")
+        return [
+            dspy.Prediction(
+                entities=list(result.get("entities") or []),
+                intent=str(result.get("intent") or ""),
+            )
+            for result in results
+        ]
+
+
 if __name__ == "__main__":
-    from agent_poc.semantic_layer.engine import ontology_entities
     from agent_poc.utils.dspy_helper import DspyHelper
     import agent_poc.utils.mlflow_helper as mlflow_helper
 
@@ -65,7 +260,7 @@ if __name__ == "__main__":
     )
 
     # Run
-    res = qu(sample_query, ontology_entities)
+    res = qu(sample_query)
 
     print("Entities:", res.entities)
     print("Intent:", res.intent)
@@ -1,12 +1,30 @@
+import asyncio
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import cache, lru_cache
+from typing import List, Optional, Tuple
+
 import dspy
-import yaml
+import numpy as np
 from pathlib import Path
+from tqdm import tqdm
 
-from dspy import MIPROv2, Example
+from dspy import BootstrapFewShot, MIPROv2, Example
+from dspy.utils.exceptions import AdapterParseError
 
-from agent_poc.modules.query_understanding.query_understanding import QueryUnderstanding
+from agent_poc.modules.query_understanding.query_understanding import (
+    BulkQueryUnderstanding,
+    QueryUnderstanding,
+)
+from agent_poc.utils.concurrency import submit_in_context
 from agent_poc.utils.dspy_helper import DspyHelper
-from agent_poc.semantic_layer.engine import ontology_entities
+from agent_poc.utils.llm_cache import cache_llm, get_disk_cache, make_cache_key
+from agent_poc.utils.semantic_cache import embed_text
+from agent_poc.utils.yaml_loader import load_yaml_cached
+
+logger = logging.getLogger(__name__)
 
 DspyHelper.init_kimi()
 
@@ -17,18 +35,19 @@ step1 = QueryUnderstanding()
 # 2. Load training and test data from YAML files
 def load_examples_from_yaml(yaml_path: str) -> list:
     """Load examples from YAML file and convert to DSPy Example objects."""
-    path = Path(yaml_path)
-    with path.open("r", encoding="utf-8") as f:
-        data = yaml.safe_load(f)
+    data = load_yaml_cached(yaml_path)
 
     examples = []
     for item in data["examples"]:
+        # The ontology is the same for every example; QueryUnderstanding
+        # supplies it, so examples only carry the query
         example = Example(
             query=item["query"],
-            ontology_entities=ontology_entities,
             entities=item["entities"],
             intent=item["intent"],
-        ).with_inputs("query", "ontology_entities")
+        ).with_inputs("query")
+        # Scored many times during optimization; "_" attributes are not fields
+        example._expected_entities = frozenset(item["entities"])
         examples.append(example)
 
     return examples
@@ -55,6 +74,83 @@ class IntentJudge(dspy.Signature):
     score: float = dspy.OutputField(desc="Semantic similarity score between 0 and 1")
 
 
+class IntentJudgeBatch(dspy.Signature):
+    """Evaluate, for each pair, if the two intents are semantically equivalent."""
+
+    pairs: List[Tuple[str, str]] = dspy.InputField(
+        desc="(expected/ground truth intent, predicted intent) pairs"
+    )
+    scores: List[float] = dspy.OutputField(
+        desc="One semantic similarity score between 0 and 1 per pair, in order"
+    )
+
+
+JUDGE_CACHE_NAMESPACE = "intent_judge"
+# Scores from the batched judge are kept apart: they come from another prompt
+# and must not be served as per-pair judgments
+JUDGE_BATCH_CACHE_NAMESPACE = "intent_judge_batch"
+
+# Scalar judgments; Predict keeps the metric loop at roughly half the output
+# tokens of ChainOfThought
+intent_judge = dspy.Predict(IntentJudge)
+intent_judge_batch = dspy.Predict(IntentJudgeBatch)
+
+
+@cache
+def _get_judge_lm():
+    """
+    The judge LM, created on the first judged intent rather than at import.
+
+    Intent judging is a small scalar prompt; it can run on a cheaper local model.
+    """
+    return DspyHelper.init_judge()
+
+
+def _judge_context():
+    judge_lm = _get_judge_lm()
+    return dspy.context(lm=judge_lm) if judge_lm is not None else nullcontext()
+
+
+def _has_required_fields(pred) -> bool:
+    return bool(pred) and hasattr(pred, "entities") and hasattr(pred, "intent")
+
+
+def _normalize_intent(intent: str) -> str:
+    # "container_eta" and "Container ETA" are the same label
+    return re.sub(r"[\s_-]+", " ", str(intent).strip().lower())
+
+
+def _judge_inputs(example, pred) -> dict:
+    """Judge inputs, normalized so that equivalent pairs share a cache entry."""
+    return {
+        "expected_intent": _normalize_intent(example.intent),
+        "predicted_intent": _normalize_intent(pred.intent),
+    }
+
+
+def _intent_matches(example, pred) -> bool:
+    """Intents equal up to case and whitespace; certain to score 1.0."""
+    return _normalize_intent(pred.intent) == _normalize_intent(example.intent)
+
+
+def _entity_score(example, pred) -> float:
+    """Entity extraction F1 (0 to 1)."""
+    # Precomputed by load_examples_from_yaml; copies made by optimizers lose it
+    expected_entities = getattr(example, "_expected_entities", None)
+    if expected_entities is None:
+        expected_entities = frozenset(example.entities)
+    if not expected_entities:
+        return 0.0
+
+    predicted_entities = frozenset(pred.entities)
+    if not predicted_entities:
+        return 0.0
+    correct = len(expected_entities & predicted_entities)
+
+    # F1 = 2PR / (P + R) = 2 * correct / (|expected| + |predicted|)
+    return 2 * correct / (len(expected_entities) + len(predicted_entities))
+
+
 def query_understanding_metric(example, pred, trace=None):
     """
     Metric to evaluate query understanding quality using LLM as judge.
@@ -63,38 +159,177 @@ def query_understanding_metric(example, pred, trace=None):
     score = 0.0
 
     # Check if prediction has required fields
-    if not pred or not hasattr(pred, "entities") or not hasattr(pred, "intent"):
+    if not _has_required_fields(pred):
         return 0.0
 
-    # 1. Intent accuracy using LLM judge with CoT (50% of score)
+    # 1. Intent accuracy using LLM judge (50% of score); no need to ask the
+    # judge about an exact match, or about an empty (malformed) intent
+    if _intent_matches(example, pred):
+        score += 0.5
+    elif _normalize_intent(pred.intent):
+        score += 0.5 * _judge_intent(example, pred)
+
+    # 2. Entity extraction (50% of score)
+    score += 0.5 * _entity_score(example, pred)
+
+    return score
+
+
+def _judge_intent(example, pred) -> float:
+    """LLM-judged intent similarity (0 to 1)."""
     try:
-        judge = dspy.ChainOfThought(IntentJudge)
-        judgment = judge(expected_intent=example.intent, predicted_intent=pred.intent)
-        intent_score = float(judgment.score)
-        # Clamp score between 0 and 1
-        intent_score = max(0.0, min(1.0, intent_score))
-        score += 0.5 * intent_score
+        with _judge_context():
+            return _memo_judge_score(
+                lm_model=getattr(dspy.settings.lm, "model", None),
+                **_judge_inputs(example, pred),
+            )
     except Exception:
-        # Fallback to exact match if LLM judge fails
-        if pred.intent == example.intent:
-            score += 0.5
+        # Fallback to exact match if LLM judge fails (already known not to match)
+        return 0.0
+
+
+# The same (expected, predicted) pairs recur across optimizer trials; scores
+# are kept on disk (when AGENT_POC_CACHE is set), keyed by the judge model too
+@cache_llm(JUDGE_CACHE_NAMESPACE, ttl=None)
+def _judge_score(*, expected_intent: str, predicted_intent: str) -> float:
+    judgment = intent_judge(
+        expected_intent=expected_intent, predicted_intent=predicted_intent
+    )
+    # Clamp score between 0 and 1
+    return max(0.0, min(1.0, float(judgment.score)))
+
+
+# In-process layer in front of the disk cache, which may be disabled; failed
+# judgments raise and are not memoized
+@lru_cache(maxsize=20000)
+def _memo_judge_score(
+    *, expected_intent: str, predicted_intent: str, lm_model: Optional[str]
+) -> float:
+    return _judge_score(
+        expected_intent=expected_intent, predicted_intent=predicted_intent
+    )
+
+
+def _judge_intents_concurrently(pairs, max_workers=16) -> List[float]:
+    """`_judge_intent` over (example, pred) pairs, in order, judged concurrently."""
+    if len(pairs) <= 1:
+        return [_judge_intent(example, pred) for example, pred in pairs]
+    with ThreadPoolExecutor(max_workers=min(len(pairs), max_workers)) as pool:
+        futures = [
+            submit_in_context(pool, _judge_intent, example, pred)
+            for example, pred in pairs
+        ]
+        return [f.result() for f in futures]
+
+
+def query_understanding_batch_metric(examples, preds) -> List[float]:
+    """
+    Same scores as `query_understanding_metric`, with all non-matching intents
+    judged in a single LLM call. Falls back to per-example judging if the
+    batched output is malformed (wrong length or non-numeric scores).
+    """
+    scored = [i for i, pred in enumerate(preds) if _has_required_fields(pred)]
+    scores = [0.0] * len(examples)
+    intent_by_index = {}
+    for i in scored:
+        if _intent_matches(examples[i], preds[i]):
+            intent_by_index[i] = 1.0
+        elif not _normalize_intent(preds[i].intent):
+            intent_by_index[i] = 0.0
+    judged = [i for i in scored if i not in intent_by_index]
+
+    # Pairs judged before (by the same judge model), alone or in a batch, are
+    # served from disk
+    cache = get_disk_cache()
+    cache_keys = {}
+    if judged and cache is not None:
+        with _judge_context():
+            for i in judged:
+                inputs = _judge_inputs(examples[i], preds[i])
+                cached = cache.get(make_cache_key(JUDGE_CACHE_NAMESPACE, inputs))
+                cache_keys[i] = make_cache_key(JUDGE_BATCH_CACHE_NAMESPACE, inputs)
+                if cached is None:
+                    cached = cache.get(cache_keys[i])
+                if cached is not None:
+                    intent_by_index[i] = cached
+        judged = [i for i in judged if i not in intent_by_index]
+
+    if judged:
+        try:
+            with _judge_context():
+                judgment = intent_judge_batch(
+                    pairs=[
+                        tuple(_judge_inputs(examples[i], preds[i]).values())
+                        for i in judged
+                    ]
+                )
+            intent_scores = [float(s) for s in judgment.scores]
+            if len(intent_scores) != len(judged):
+                raise ValueError(
+                    f"Expected {len(judged)} scores, got {len(intent_scores)}"
+                )
+        except (AdapterParseError, ValueError, TypeError):
+            logger.warning(
+                "Malformed batch judgment; judging %d pairs one by one",
+                len(judged),
+                exc_info=True,
+            )
+            # per-pair judging (concurrent) caches its own results
+            intent_scores = _judge_intents_concurrently(
+                [(examples[i], preds[i]) for i in judged]
+            )
+            cache_keys = {}
+
+        for i, intent_score in zip(judged, intent_scores):
+            # Clamp score between 0 and 1
+            intent_by_index[i] = max(0.0, min(1.0, intent_score))
+            if i in cache_keys:
+                cache.set(cache_keys[i], intent_by_index[i], expire=None)
+
+    for i in scored:
+        scores[i] = 0.5 * intent_by_index[i] + 0.5 * _entity_score(
+            examples[i], preds[i]
+        )
+    return scores
+
+
+@cache
+def _known_intents() -> Tuple[Tuple[str, ...], np.ndarray]:
+    """
+    Intent labels of the training set and their embeddings, built on first use.
+    Test labels are left out, so evaluation cannot snap onto them.
+    """
+    labels = tuple(sorted({_normalize_intent(e.intent) for e in trainset}))
+    return labels, np.stack([embed_text(label) for label in labels])
 
-    # 2. Entity extraction (50% of score)
-    if len(example.entities) > 0:
-        expected_entities = {e for e in example.entities}
-        predicted_entities = {e for e in pred.entities}
 
-        # Calculate precision and recall
-        if len(predicted_entities) > 0:
-            correct = len(expected_entities & predicted_entities)
-            precision = correct / len(predicted_entities)
-            recall = correct / len(expected_entities)
+def _nearest_known_intent(intent: str) -> str:
+    """The known intent label closest to `intent` (cosine of trigram embeddings)."""
+    labels, embeddings = _known_intents()
+    normalized = _normalize_intent(intent)
+    if normalized in labels:
+        return normalized
+    return labels[int(np.argmax(embeddings @ embed_text(normalized)))]
 
-            # F1 score for entities
-            if precision + recall > 0:
-                f1 = 2 * (precision * recall) / (precision + recall)
-                score += 0.5 * f1
 
+def query_understanding_label_metric(example, pred, trace=None):
+    """
+    Judge-free variant of `query_understanding_metric` that makes no LLM calls.
+
+    The predicted intent counts as correct if it is, or is closest to, the
+    expected label among the training set's intent labels. Only suitable while predictions stick
+    to the label vocabulary (e.g. after few-shot optimization); free-form
+    intents need the LLM judge.
+    """
+    if not _has_required_fields(pred):
+        return 0.0
+
+    score = 0.0
+    if _normalize_intent(pred.intent) and _nearest_known_intent(
+        pred.intent
+    ) == _normalize_intent(example.intent):
+        score += 0.5
+    score += 0.5 * _entity_score(example, pred)
     return score
 
 
@@ -105,16 +340,40 @@ OPTIMIZED_MODEL_PATH = (
     "src/agent_poc/modules/query_understanding/query_understanding_optimized.json"
 )
 
+# Below this many training examples MIPRO's candidate search costs far more LLM
+# calls than it gains over plain few-shot bootstrapping
+BOOTSTRAP_MAX_TRAINSET = 50
+
 
-def evaluate_model(model, testset, metric_fn, title="Evaluating Model"):
+def evaluate_model(
+    model,
+    testset,
+    metric_fn,
+    title="Evaluating Model",
+    max_concurrent=8,
+    batch_metric_fn=None,
+    bulk_model=None,
+):
     """
     Evaluate a model on test set and return metrics.
 
+    Examples are predicted and scored concurrently (the LLM calls dominate), with
+    at most `max_concurrent` examples in flight; each result is reported as soon
+    as it completes, with a progress bar, and the scores are returned in order.
+    If `batch_metric_fn(examples, preds)` is given, all predictions are collected
+    first and scored in one call instead of calling `metric_fn` per example.
+    If `bulk_model` (a `BulkQueryUnderstanding`) is given, all queries are
+    predicted in a single LLM call, falling back to `model` per example if the
+    bulk output is malformed.
+
     Args:
         model: The DSPy module to evaluate
         testset: List of test examples
         metric_fn: Metric function to score predictions
         title: Title for the evaluation output
+        max_concurrent: Cap on concurrent examples (provider rate limits)
+        batch_metric_fn: Optional metric scoring all predictions at once
+        bulk_model: Optional module predicting all queries at once
 
     Returns:
         dict: Evaluation results including average score and individual scores
@@ -123,19 +382,78 @@ def evaluate_model(model, testset, metric_fn, title="Evaluating Model"):
     print(f"### {title} ###")
     print(f"{'=' * 80}")
 
-    total_score = 0.0
-    scores = []
+    def report(i, example, outcome):
+        # tqdm.write keeps the progress bar below the streamed results
+        if isinstance(outcome, Exception):
+            tqdm.write(f"\n[Test {i}] Failed: {outcome!r}")
+            tqdm.write(f"Query: {example.query}")
+            return
+
+        result, score = outcome
+        tqdm.write(f"\n[Test {i}] Score: {score:.2f}")
+        tqdm.write(f"Query: {example.query}")
+        tqdm.write(f"Expected intent: {example.intent} | Predicted: {result.intent}")
+        tqdm.write(
+            f"Expected entities: {example.entities} | Predicted: {result.entities}"
+        )
 
-    for i, example in enumerate(testset, 1):
-        result = model(query=example.query, ontology_entities=example.ontology_entities)
-        score = metric_fn(example, result)
-        total_score += score
-        scores.append(score)
+    bulk_preds = None
+    if bulk_model is not None:
+        try:
+            bulk_preds = bulk_model([example.query for example in testset])
+        except Exception as exc:
+            print(f"Bulk prediction failed ({exc!r}); predicting per example")
+
+    async def run_all():
+        semaphore = asyncio.Semaphore(max_concurrent)
+
+        def predict_and_score(i, example):
+            if bulk_preds is not None:
+                result = bulk_preds[i]
+            else:
+                result = model(**example.inputs())
+            if batch_metric_fn is not None:
+                return result, None
+            return result, metric_fn(example, result)
+
+        async def run_one(i, example):
+            async with semaphore:
+                try:
+                    return i, await asyncio.to_thread(predict_and_score, i, example)
+                except Exception as exc:
+                    return i, exc
+
+        outcomes = [None] * len(testset)
+        tasks = [run_one(i, example) for i, example in enumerate(testset)]
+        for next_done in tqdm(
+            asyncio.as_completed(tasks), total=len(tasks), desc=title
+        ):
+            i, outcome = await next_done
+            outcomes[i] = outcome
+            if batch_metric_fn is None:
+                report(i + 1, testset[i], outcome)
+        return outcomes
+
+    outcomes = asyncio.run(run_all())
+
+    if batch_metric_fn is not None:
+        predicted = [
+            i
+            for i, outcome in enumerate(outcomes)
+            if not isinstance(outcome, Exception)
+        ]
+        batch_scores = batch_metric_fn(
+            [testset[i] for i in predicted], [outcomes[i][0] for i in predicted]
+        )
+        for i, score in zip(predicted, batch_scores):
+            outcomes[i] = (outcomes[i][0], score)
+        for i, (example, outcome) in enumerate(zip(testset, outcomes), 1):
+            report(i, example, outcome)
 
-        print(f"\n[Test {i}] Score: {score:.2f}")
-        print(f"Query: {example.query}")
-        print(f"Expected intent: {example.intent} | Predicted: {result.intent}")
-        print(f"Expected entities: {example.entities} | Predicted: {result.entities}")
+    scores = [
+        0.0 if isinstance(outcome, Exception) else outcome[1] for outcome in outcomes
+    ]
+    total_score = sum(scores)
 
     avg_score = total_score / len(testset) if testset else 0
     print(f"\n{'=' * 80}")
@@ -149,32 +467,83 @@ def evaluate_model(model, testset, metric_fn, title="Evaluating Model"):
     }
 
 
-def train_model(base_model, trainset, metric_fn, save_path):
+def train_model(
+    base_model,
+    trainset,
+    metric_fn,
+    save_path,
+    strategy="auto",
+    num_threads=16,
+    num_candidates=8,
+    num_trials=20,
+    minibatch_size=25,
+):
     """
-    Train/optimize a model using MIPRO optimizer.
+    Train/optimize a model using BootstrapFewShot or the MIPRO optimizer.
+
+    With strategy "auto", small training sets (fewer than
+    BOOTSTRAP_MAX_TRAINSET examples) use BootstrapFewShot and larger ones MIPRO.
+    MIPRO scores candidates on minibatches of a held-out validation split (a
+    fifth of the training examples), with `num_threads` examples evaluated in
+    parallel; every `minibatch_full_eval_steps` trials the best candidate is
+    re-scored on the full split.
 
     Args:
         base_model: Base DSPy module to optimize
         trainset: Training examples
         metric_fn: Metric function for optimization
         save_path: Path to save the optimized model
+        strategy: "auto", "bootstrap" or "mipro"
+        num_threads: Parallel evaluation threads for MIPRO (provider rate limits)
+        num_candidates: MIPRO instruction/demo candidates per predictor
+        num_trials: Number of MIPRO optimization trials
+        minibatch_size: Validation examples scored per MIPRO trial
 
     Returns:
         Compiled/optimized model
     """
+    if strategy == "auto":
+        strategy = "bootstrap" if len(trainset) < BOOTSTRAP_MAX_TRAINSET else "mipro"
+    if strategy not in ("bootstrap", "mipro"):
+        raise ValueError(f"Unknown optimization strategy: {strategy!r}")
+
     print("\n" + "=" * 80)
-    print("### Starting Model Optimization ###")
+    print(f"### Starting Model Optimization ({strategy}) ###")
     print("=" * 80)
 
-    # MIPRO will optimize both instructions and demonstrations
-    optimizer = MIPROv2(
-        metric=metric_fn,
-        auto="medium",  # Can be "light", "medium", or "heavy"
-        verbose=True,
-        track_stats=True,
-    )
+    if strategy == "bootstrap":
+        # Demonstrations only: one pass over the trainset, no candidate search
+        optimizer = BootstrapFewShot(
+            metric=metric_fn, max_bootstrapped_demos=4, max_labeled_demos=8
+        )
+        compiled_model = optimizer.compile(base_model, trainset=trainset)
+    else:
+        # MIPRO will optimize both instructions and demonstrations. `auto` would
+        # override num_candidates/num_trials, so the search budget is set
+        # explicitly.
+        optimizer = MIPROv2(
+            metric=metric_fn,
+            auto=None,
+            num_candidates=num_candidates,
+            num_threads=num_threads,
+            verbose=True,
+            track_stats=True,
+        )
 
-    compiled_model = optimizer.compile(base_model, trainset=trainset)
+        n_val = max(1, len(trainset) // 5)
+        valset, trainset = trainset[:n_val], trainset[n_val:]
+        # Minibatching only pays off once the validation split exceeds one batch
+        minibatch = len(valset) > minibatch_size
+
+        compiled_model = optimizer.compile(
+            student=base_model,
+            trainset=trainset,
+            valset=valset,
+            num_trials=num_trials,
+            minibatch=minibatch,
+            minibatch_size=min(minibatch_size, len(valset)),
+            minibatch_full_eval_steps=10,
+        )
 
     # Save the optimized model
     compiled_model.save(save_path)
@@ -221,6 +590,7 @@ if __name__ == "__main__":
             testset,
             query_understanding_metric,
             "Evaluating Loaded Optimized Model",
+            batch_metric_fn=query_understanding_batch_metric,
         )
 
     else:
@@ -229,7 +599,13 @@ if __name__ == "__main__":
         # Step 1: Evaluate baseline model (before optimization)
         print("\n>>> STEP 1: Baseline Evaluation (Before Optimization)")
         baseline_results = evaluate_model(
-            step1, testset, query_understanding_metric, "Baseline Model Performance"
+            step1,
+            testset,
+            query_understanding_metric,
+            "Baseline Model Performance",
+            batch_metric_fn=query_understanding_batch_metric,
+            # The baseline has no demos, so the bulk prompt is equivalent
+            bulk_model=BulkQueryUnderstanding(),
         )
 
         # Step 2: Train/optimize the model
@@ -245,6 +621,7 @@ if __name__ == "__main__":
             testset,
             query_understanding_metric,
             "Optimized Model Performance",
+            batch_metric_fn=query_understanding_batch_metric,
         )
 
         # Step 4: Compare results
@@ -0,0 +1,71 @@
+from typing import Dict, List, Tuple
+
+import dspy
+
+from agent_poc.modules.semantic_grounding.relation_filtering import verdicts_by_key
+
+
+class CombinedGroundingSignature(dspy.Signature):
+    """
+    Steps 1 + 2.2 in one call: extract related entities and the high-level
+    intent, and judge which candidate ontology relations are relevant.
+    """
+
+    query: str = dspy.InputField(desc="User question in natural language.")
+
+    ontology_entities: str = dspy.InputField(
+        desc="JSON array of ontology entities, each [EntityName, Description]."
+    )
+
+    relations: List[Tuple[str, str, str, str]] = dspy.InputField(
+        desc=(
+            "Candidate relations to judge relevance. "
+            "Each element is (source_entity, relation_name, target_entity, description)."
+        )
+    )
+
+    entities: List[str] = dspy.OutputField(
+        desc=(
+            "Related entities mentioned in the query. It must come from the ontology_entities."
+        )
+    )
+
+    intent: str = dspy.OutputField(
+        desc="A short high-level intent label capturing the user's goal, less than 8 words."
+    )
+
+    relevant: List[Dict[str, str]] = dspy.OutputField(
+        desc=(
+            "One verdict per relation: "
+            "{'source': source_entity, 'name': relation_name, "
+            "'target': target_entity, 'relevant': 'yes'/'no'}."
+        )
+    )
+
+
+class CombinedGrounding(dspy.Module):
+    """
+    Query understanding and relation filtering fused into one LLM round-trip.
+
+    Only worthwhile while the candidate relation set is small enough to judge in
+    a single prompt; see `run_combined_grounding` for the fallback.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.predict = dspy.Predict(CombinedGroundingSignature)
+
+    def forward(
+        self,
+        query: str,
+        ontology_entities: str,
+        relations: List[Tuple[str, str, str, str]],
+    ) -> dspy.Prediction:
+        result = self.predict(
+            query=query, ontology_entities=ontology_entities, relations=relations
+        )
+        return dspy.Prediction(
+            entities=result.entities,
+            intent=result.intent,
+            relevant=verdicts_by_key(result.relevant),
+        )
@@ -1,47 +1,48 @@
 # semantic_grounding/entity_expansion.py
 
-from typing import Dict, List, Set
+from collections import defaultdict, deque
+from typing import DefaultDict, Dict, List, Set, Tuple
 
 from agent_poc.semantic_layer.ontology import RelationKey
 
 
 def expand_entities(
-    step1_entities: List[str], relevant_relations: Dict[RelationKey, str]
-) -> List[str]:
+    step1_entities: List[dict], relevant_relations: Dict[RelationKey, str]
+) -> Tuple[List[str], List[RelationKey]]:
     """
     Step 2.3: Deterministic entity expansion.
 
     Input:
-      - step1_entities: ["City", ...]
+      - step1_entities: [{"type": "City", ...}, ...]
       - relevant_relations: dict mapping RelationKey to "yes"/"no"
     Output:
-      - expanded_entity_types: list of entity type strings
+      - expanded_entity_types: sorted list of entity type strings
+      - active_relations: the relations judged "yes", in input order
     """
 
     # 1. collect initial entity types
     entity_types: Set[str] = {e["type"] for e in step1_entities}
 
-    # 2. filter relations = yes
-    active_relations: List[RelationKey] = [
-        rel for rel, val in relevant_relations.items() if str(val).lower() == "yes"
-    ]
-
-    # 3. one-pass deterministic expansion
-    changed = True
-    while changed:
-        changed = False
-
-        for rel in active_relations:
-            source, _, target = rel
-            # If source is included → include target
-            if source in entity_types and target not in entity_types:
-                entity_types.add(target)
-                changed = True
-
-            # If target is included → include source
-            if target in entity_types and source not in entity_types:
-                entity_types.add(source)
-                changed = True
+    # 2. filter relations = yes, building the (undirected) adjacency of the
+    #    active relations in the same pass
+    active_relations: List[RelationKey] = []
+    adjacency: DefaultDict[str, List[str]] = defaultdict(list)
+    for rel, val in relevant_relations.items():
+        if str(val).lower() != "yes":
+            continue
+        active_relations.append(rel)
+        source, _, target = rel
+        adjacency[source].append(target)
+        adjacency[target].append(source)
+
+    # 3. deterministic expansion: everything connected to a seed type through
+    #    active relations (either direction), in one BFS over the adjacency
+    queue = deque(entity_types)
+    while queue:
+        for neighbour in adjacency[queue.popleft()]:
+            if neighbour not in entity_types:
+                entity_types.add(neighbour)
+                queue.append(neighbour)
 
     return sorted(entity_types), active_relations
 
@@ -4,6 +4,10 @@ from __future__ import annotations
 
 from typing import List, Tuple
 
+from agent_poc.modules.query_understanding.query_understanding import (
+    QueryUnderstanding,
+)
+from agent_poc.modules.semantic_grounding.combined_grounding import CombinedGrounding
 from agent_poc.modules.semantic_grounding.entity_expansion import expand_entities
 from agent_poc.modules.semantic_grounding.relation_discovery import discover_relations
 from agent_poc.modules.semantic_grounding.relation_filtering import RelationFiltering
@@ -39,16 +43,75 @@ def run_semantic_grounding(
     return expanded_entities, active_relations
 
 
+def run_combined_grounding(
+    query: str,
+    ontology_entities: str,
+    combined_model: CombinedGrounding | None = None,
+    query_understanding: QueryUnderstanding | None = None,
+    filtering_model: RelationFiltering | None = None,
+    max_fused_relations: int = 40,
+) -> Tuple[List[str], str, List[str], List[RelationKey]]:
+    """
+    Pipeline Steps 1 + 2 with a single LLM call when the ontology is small.
+
+    Every ontology relation is a candidate, so while there are at most
+    `max_fused_relations` of them, entities, intent and relation relevance come
+    from one CombinedGrounding call; otherwise this falls back to query
+    understanding followed by `run_semantic_grounding`.
+
+    Returns (entities, intent, expanded_entities, active_relations).
+    """
+    candidate_relations = discover_relations(
+        [{"type": name} for name in semantic_layer.entities]
+    )
+
+    if len(candidate_relations) > max_fused_relations:
+        query_understanding = query_understanding or QueryUnderstanding()
+        qu_result = query_understanding(
+            query=query, ontology_entities=ontology_entities
+        )
+        entities = [{"type": name} for name in qu_result.entities]
+        expanded_entities, active_relations = run_semantic_grounding(
+            query=query,
+            entities=entities,
+            intent=qu_result.intent,
+            filtering_model=filtering_model,
+        )
+        return qu_result.entities, qu_result.intent, expanded_entities, active_relations
+
+    combined_model = combined_model or CombinedGrounding()
+    result = combined_model(
+        query=query,
+        ontology_entities=ontology_entities,
+        relations=candidate_relations,
+    )
+    if not result.entities:
+        return [], result.intent, [], []
+
+    # Only relations touching the query's entities, as in the two-stage path
+    reachable = {
+        rel[:3]
+        for rel in discover_relations([{"type": name} for name in result.entities])
+    }
+    expanded_entities, active_relations = expand_entities(
+        step1_entities=[{"type": name} for name in result.entities],
+        relevant_relations={
+            key: val for key, val in result.relevant.items() if key in reachable
+        },
+    )
+    return result.entities, result.intent, expanded_entities, active_relations
+
+
 if __name__ == "__main__":
     from agent_poc.utils.dspy_helper import DspyHelper
     from agent_poc.modules.query_understanding.query_understanding import (
         QueryUnderstanding,
     )
-    from agent_poc.semantic_layer.engine import semantic_layer, ontology_entities
+    from agent_poc.semantic_layer.engine import semantic_layer, ontology_entities_json
 
     DspyHelper.init_kimi()
 
-    qu = QueryUnderstanding(ontology_entities)
+    qu = QueryUnderstanding()
     qu.load(
         "src/agent_poc/modules/query_understanding/query_understanding_optimized_2.json"
     )
@@ -56,9 +119,9 @@ if __name__ == "__main__":
     sample_query = (
         "How many containers were gated out of Sydney terminal on 20 July 2025?"
     )
-    qu_result = qu(query=sample_query)
+    qu_result = qu(query=sample_query, ontology_entities=ontology_entities_json)
 
-    filtering_model = RelationFiltering(batch_size=4)
+    filtering_model = RelationFiltering()
     expanded_entities, active_relations = run_semantic_grounding(
         query=sample_query,
         entities=qu_result.entities,
@@ -1,12 +1,12 @@
-from typing import List, Sequence, Tuple
+from typing import Dict, List, Sequence, Set
 
 from agent_poc.semantic_layer.ontology import RelationKey
-from agent_poc.semantic_layer.engine import semantic_layer
+from agent_poc.semantic_layer.engine import RelationTuple, semantic_layer
 
 
 def discover_relations(
     seed_entities: Sequence[dict],
-) -> List[Tuple[str, str, str, str]]:
+) -> List[RelationTuple]:
     """Discover unique ontology relations touching the provided entity types.
 
     Args:
@@ -16,28 +16,24 @@ def discover_relations(
     Returns:
         List of tuples (from_entity, relation_name, to_entity, description)
     """
-    seen: set[RelationKey] = set()
-    candidates: List[Tuple[str, str, str, str]] = []
+    # One insertion-ordered dict both dedups (first occurrence wins) and keeps
+    # order; the per-entity relation tuples are precomputed by the semantic layer
+    unique: Dict[RelationKey, RelationTuple] = {}
+    relations_by_entity = semantic_layer.relations_by_entity
+    seen_types: Set[str] = set()
 
     for entity in seed_entities:
         entity_type = entity.get("type")
-        if not entity_type:
+        # repeated mentions of a type (e.g. two cities) share its relations
+        if not entity_type or entity_type in seen_types:
             continue
+        seen_types.add(entity_type)
 
-        for rel in semantic_layer.list_relations(entity_type):
-            if rel.key in seen:
-                continue
-            seen.add(rel.key)
-            candidates.append(
-                (
-                    rel.from_entity,
-                    rel.name,
-                    rel.to_entity,
-                    rel.description or "",
-                )
-            )
-
-    return candidates
+        # a relation between two seed types is reached from both ends
+        for rel in relations_by_entity.get(entity_type, ()):
+            unique.setdefault(rel[:3], rel)
+
+    return list(unique.values())
 
 
 if __name__ == "__main__":
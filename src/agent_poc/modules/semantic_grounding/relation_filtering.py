@@ -1,7 +1,99 @@
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import List, Optional, Tuple, Dict
+
 import dspy
-from typing import List, Tuple, Dict
+import numpy as np
 
 from agent_poc.semantic_layer.ontology import RelationKey
+from agent_poc.utils.concurrency import submit_in_context
+from agent_poc.utils.llm_cache import StateFingerprint
+from agent_poc.utils.semantic_cache import SemanticCache, embed_text
+
+logger = logging.getLogger(__name__)
+
+_VERDICT_FIELDS = ("source", "name", "target", "relevant")
+
+# Rough prompt-token estimate; relation batches only need to be packed
+# approximately, and the configured model's tokenizer is not generally
+# available locally
+_CHARS_PER_TOKEN = 4
+
+
+def _estimate_tokens(relation: Tuple[str, str, str, str]) -> int:
+    return sum(len(part) for part in relation) // _CHARS_PER_TOKEN + 1
+
+
+def pack_relations(
+    relations: List[Tuple[str, str, str, str]], max_batch_tokens: int
+) -> List[List[Tuple[str, str, str, str]]]:
+    """
+    Group relations into as few batches as fit `max_batch_tokens` each.
+
+    First-fit decreasing: longest relations are placed first, each into the
+    first batch with room left. A relation larger than the budget gets a batch
+    of its own.
+    """
+    batches: List[List[Tuple[str, str, str, str]]] = []
+    loads: List[int] = []
+    for relation in sorted(relations, key=_estimate_tokens, reverse=True):
+        tokens = _estimate_tokens(relation)
+        for i, load in enumerate(loads):
+            if load + tokens <= max_batch_tokens:
+                batches[i].append(relation)
+                loads[i] += tokens
+                break
+        else:
+            batches.append([relation])
+            loads.append(tokens)
+    return batches
+
+
+def verdicts_by_key(verdicts: List[Dict[str, str]]) -> Dict[RelationKey, str]:
+    """
+    Key typed relation verdicts ({source, name, target, relevant}) by RelationKey.
+
+    Key parts are interned like the ontology's own relation names, so later
+    lookups against ontology keys mostly compare by identity. Malformed items
+    in the LLM output are logged and skipped; their relations get no verdict.
+    """
+    keyed: Dict[RelationKey, str] = {}
+    for verdict in verdicts:
+        fields = (
+            [verdict.get(k) for k in _VERDICT_FIELDS]
+            if isinstance(verdict, dict)
+            else None
+        )
+        if fields is None or not all(isinstance(f, str) for f in fields):
+            logger.warning("Skipping malformed relation verdict: %r", verdict)
+            continue
+        source, name, target, relevant = fields
+        keyed[(sys.intern(source), sys.intern(name), sys.intern(target))] = relevant
+    return keyed
+
+
+@lru_cache(maxsize=4096)
+def _relation_embedding(relation: Tuple[str, str, str, str]) -> np.ndarray:
+    source, name, target, description = relation
+    return embed_text(f"{source} {name.replace('_', ' ')} {target}: {description}")
+
+
+def prefilter_relations(
+    query: str, relations: List[Tuple[str, str, str, str]], top_k: int
+) -> List[Tuple[str, str, str, str]]:
+    """
+    The `top_k` relations most similar to the query (cheap text similarity), in
+    their original order. Relation embeddings are computed once per relation.
+    """
+    if len(relations) <= top_k:
+        return list(relations)
+    matrix = np.stack([_relation_embedding(tuple(rel)) for rel in relations])
+    scores = matrix @ embed_text(query)
+    # stable sort keeps the original order among equal scores
+    keep = np.sort(np.argsort(-scores, kind="stable")[:top_k])
+    return [relations[i] for i in keep]
 
 
 class RelationFilteringSignature(dspy.Signature):
@@ -9,6 +101,9 @@ class RelationFilteringSignature(dspy.Signature):
     Step 2.2 - LLM binary filtering classification for ontology relations.
     """
 
+    # Inputs are rendered in declaration order: query and intent come first so
+    # every batch of one request shares a byte-identical prompt prefix (reused
+    # by servers with prefix/KV caching); only the relations differ
     query: str = dspy.InputField(desc="User question in natural language.")
 
     intent: str = dspy.InputField(desc="High-level task intent extracted in Step 1.")
@@ -20,19 +115,43 @@ class RelationFilteringSignature(dspy.Signature):
         )
     )
 
-    relevant: Dict[str, str] = dspy.OutputField(
+    relevant: List[Dict[str, str]] = dspy.OutputField(
         desc=(
-            "Mapping from relation_key string to 'yes'/'no'. "
-            "Format: 'source_entity.relation_name->target_entity'."
+            "One verdict per relation: "
+            "{'source': source_entity, 'name': relation_name, "
+            "'target': target_entity, 'relevant': 'yes'/'no'}."
         )
     )
 
 
 class RelationFiltering(dspy.Module):
-    def __init__(self, batch_size: int = 5):
+    def __init__(
+        self,
+        batch_size: int = 20,
+        semantic_cache: Optional[SemanticCache] = None,
+        max_batch_tokens: Optional[int] = None,
+        max_concurrent: int = 8,
+        top_k: Optional[int] = None,
+    ):
         super().__init__()
+        # Yes/no verdicts are short, so a batch of 20 relations still fits easily
+        # in a prompt; larger batches mean fewer round-trips
         self.batch_size = batch_size
-        self.predict = dspy.ChainOfThought(RelationFilteringSignature)
+        # When set, batches are packed by estimated prompt tokens instead of
+        # `batch_size` relations each
+        self.max_batch_tokens = max_batch_tokens
+        # Cap on batches judged at once (provider rate limits)
+        self.max_concurrent = max_concurrent
+        # When set, only the `top_k` relations most similar to the query are
+        # sent to the LLM; the rest are judged "no" without a call
+        self.top_k = top_k
+        # yes/no verdicts; a reasoning trace would roughly double the output tokens
+        self.predict = dspy.Predict(RelationFilteringSignature)
+        # Optional near-duplicate query cache; only queries with the same
+        # intent, judged by the same program against the exact same relation
+        # set, can hit
+        self.semantic_cache = semantic_cache
+        self._predict_state = StateFingerprint()
 
     def forward(
         self,
@@ -40,33 +159,68 @@ class RelationFiltering(dspy.Module):
         intent: str,
         relations: List[Tuple[str, str, str, str]],
     ) -> Dict[RelationKey, str]:
-        merged: Dict[RelationKey, str] = {}
-
-        # batch evaluation
-        for i in range(0, len(relations), self.batch_size):
-            batch = relations[i : i + self.batch_size]
-
-            result = self.predict(query=query, intent=intent, relations=batch)
-
-            # result.relevant is Dict[str,str]
-            merged.update(result.relevant)
-
-        # convert string key → RelationKey tuple for downstream use
+        bucket = None
+        if self.semantic_cache is not None:
+            bucket = (
+                intent,
+                self._predict_state(self.predict),
+                frozenset(tuple(rel[:3]) for rel in relations),
+            )
+            cached = self.semantic_cache.get(query, bucket)
+            if cached is not None:
+                return dict(cached)
+
+        # relations dropped by the prefilter are judged "no" up front
         final: Dict[RelationKey, str] = {}
-        for key, val in merged.items():
-            source, rest = key.split(".")
-            name, target = rest.split("->")
-            final[(source, name, target)] = val
-
+        if self.top_k is not None:
+            judged = prefilter_relations(query, relations, self.top_k)
+            kept = {tuple(rel[:3]) for rel in judged}
+            final.update(
+                (tuple(rel[:3]), "no")
+                for rel in relations
+                if tuple(rel[:3]) not in kept
+            )
+            relations = judged
+
+        # batch evaluation; batches are independent, so their LLM calls run
+        # concurrently and the results are merged in batch order
+        if self.max_batch_tokens is not None:
+            batches = pack_relations(relations, self.max_batch_tokens)
+        else:
+            batches = [
+                relations[i : i + self.batch_size]
+                for i in range(0, len(relations), self.batch_size)
+            ]
+
+        def judge(batch: List[Tuple[str, str, str, str]]) -> List[Dict[str, str]]:
+            return self.predict(query=query, intent=intent, relations=batch).relevant
+
+        if len(batches) <= 1:
+            results = [judge(batch) for batch in batches]
+        else:
+            workers = min(len(batches), self.max_concurrent)
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [submit_in_context(pool, judge, batch) for batch in batches]
+                results = [f.result() for f in futures]
+
+        for relevant in results:
+            final.update(verdicts_by_key(relevant))
+
+        if self.semantic_cache is not None:
+            self.semantic_cache.put(query, dict(final), bucket)
         return final
 
+    def load_state(self, state):
+        self._predict_state.reset()
+        return super().load_state(state)
+
 
 if __name__ == "__main__":
     from agent_poc.utils.dspy_helper import DspyHelper
     from agent_poc.modules.semantic_grounding.relation_discovery import (
         discover_relations,
     )
-    from agent_poc.semantic_layer.engine import ontology_entities
+    from agent_poc.semantic_layer.engine import ontology_entities_json
     from agent_poc.modules.query_understanding.query_understanding import (
         QueryUnderstanding,
     )
@@ -76,15 +230,17 @@ if __name__ == "__main__":
     model_path = (
         "src/agent_poc/modules/query_understanding/query_understanding_optimized_2.json"
     )
-    query_understanding = QueryUnderstanding(ontology_entities)
+    query_understanding = QueryUnderstanding()
     query_understanding.load(model_path)
 
     query = "How many containers were gated out of Sydney terminal on 20 July 2025?"
-    qu_result = query_understanding(query=query)
+    qu_result = query_understanding(
+        query=query, ontology_entities=ontology_entities_json
+    )
     entities = qu_result.entities
     candidated_relations = discover_relations(entities)
 
-    relation_filtering = RelationFiltering(batch_size=4)
+    relation_filtering = RelationFiltering()
 
     filtering_result = relation_filtering(
         query=query, intent=qu_result.intent, relations=candidated_relations
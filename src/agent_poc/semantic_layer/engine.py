@@ -1,10 +1,22 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from functools import cache, cached_property
 from importlib import import_module
 from pathlib import Path
-from typing import Any, Callable, DefaultDict, Dict, List, Optional, Sequence
+from typing import (
+    Any,
+    Callable,
+    DefaultDict,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
 from collections import defaultdict
+from itertools import chain
 
 from agent_poc.semantic_layer.ontology import (
     RelationKey,
@@ -13,7 +25,11 @@ from agent_poc.semantic_layer.ontology import (
     load_ontology,
 )
 from agent_poc.semantic_layer.tools_registry import TOOLS_REGISTRY
+from agent_poc.utils.fast_json import dumps
+
 
+# (from_entity, relation_name, to_entity, description)
+RelationTuple = Tuple[str, str, str, str]
 
 DEFAULT_TOOL_MODULES: Sequence[str] = ("agent_poc.semantic_layer.tools",)
 ONTOLOGY_SOURCE_PATH = Path(__file__).with_name("ontology_data")
@@ -47,6 +63,45 @@ class SemanticLayer:
     tools_by_relation: DefaultDict[RelationKey, List[ToolInfo]]
     tools_by_entity: DefaultDict[str, List[ToolInfo]]
 
+    # Indexes built once in __post_init__; the ontology is static once loaded.
+    # outgoing / incoming relations per entity
+    relations_from: Dict[str, Tuple[RelationSchema, ...]] = field(
+        init=False, repr=False, compare=False
+    )
+    relations_to: Dict[str, Tuple[RelationSchema, ...]] = field(
+        init=False, repr=False, compare=False
+    )
+    # relations touching each entity (outgoing, then incoming), as plain tuples
+    relations_by_entity: Dict[str, Tuple[RelationTuple, ...]] = field(
+        init=False, repr=False, compare=False
+    )
+    # lower-cased entity names and synonyms
+    _entities_by_label: Dict[str, EntitySchema] = field(
+        init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self) -> None:
+        outgoing: DefaultDict[str, List[RelationSchema]] = defaultdict(list)
+        incoming: DefaultDict[str, List[RelationSchema]] = defaultdict(list)
+        for rel in self.relations.values():
+            outgoing[rel.from_entity].append(rel)
+            incoming[rel.to_entity].append(rel)
+        self.relations_from = {name: tuple(rels) for name, rels in outgoing.items()}
+        self.relations_to = {name: tuple(rels) for name, rels in incoming.items()}
+        self.relations_by_entity = {
+            name: tuple(
+                (rel.from_entity, rel.name, rel.to_entity, rel.description or "")
+                for rel in chain(outgoing.get(name, ()), incoming.get(name, ()))
+            )
+            for name in outgoing.keys() | incoming.keys()
+        }
+
+        # First entity (in ontology order) whose name or a synonym matches wins
+        self._entities_by_label = {}
+        for ent in self.entities.values():
+            for label in (ent.name, *ent.synonyms):
+                self._entities_by_label.setdefault(label.lower(), ent)
+
     # ---------- Query helpers ----------
 
     def get_entity(self, name: str) -> Optional[EntitySchema]:
@@ -62,13 +117,7 @@ class SemanticLayer:
         Fuzzy-ish lookup: match against name or synonyms (case-insensitive).
         This is a simple match implementation. You can replace it with embedding search later.
         """
-        label_lower = label.lower()
-        for ent in self.entities.values():
-            if ent.name.lower() == label_lower:
-                return ent
-            if any(s.lower() == label_lower for s in ent.synonyms):
-                return ent
-        return None
+        return self._entities_by_label.get(label.lower())
 
     def get_relation(
         self, from_entity: str, name: str, to_entity: str
@@ -83,18 +132,51 @@ class SemanticLayer:
     def get_tools_for_entity(self, entity_name: str) -> List[ToolInfo]:
         return self.tools_by_entity.get(entity_name, [])
 
+    def candidate_tools(
+        self,
+        active_relations: Iterable[RelationKey],
+        expanded_entities: Iterable[str],
+    ) -> List[ToolInfo]:
+        """
+        Tools for the given relations, then for the given entities, deduplicated
+        by name in one pass (first occurrence wins, order is kept).
+        """
+        by_relation = self.tools_by_relation
+        by_entity = self.tools_by_entity
+        unique: Dict[str, ToolInfo] = {}
+        for tool in chain(
+            chain.from_iterable(
+                by_relation.get(tuple(rel), ()) for rel in active_relations
+            ),
+            chain.from_iterable(by_entity.get(e, ()) for e in expanded_entities),
+        ):
+            unique.setdefault(tool.name, tool)
+        return list(unique.values())
+
     def list_relations_from(self, entity_name: str) -> List[RelationSchema]:
         """List all outgoing relations from an entity."""
-        return [r for r in self.relations.values() if r.from_entity == entity_name]
+        return list(self.relations_from.get(entity_name, ()))
 
     def list_relations_to(self, entity_name: str) -> List[RelationSchema]:
         """List all incoming relations to an entity."""
-        return [r for r in self.relations.values() if r.to_entity == entity_name]
+        return list(self.relations_to.get(entity_name, ()))
 
     def list_relations(self, entity_name: str) -> List[RelationSchema]:
-        return self.list_relations_from(entity_name) + self.list_relations_to(
-            entity_name
-        )
+        """Outgoing, then incoming relations of an entity."""
+        return [
+            *self.relations_from.get(entity_name, ()),
+            *self.relations_to.get(entity_name, ()),
+        ]
+
+    @cached_property
+    def ontology_entity_descriptions(self) -> Tuple[Tuple[str, str], ...]:
+        """(name, description) for every entity; built once and hashable."""
+        return tuple((name, ent.description) for name, ent in self.entities.items())
+
+    @cached_property
+    def ontology_entity_table(self) -> str:
+        """`ontology_entity_descriptions` as a compact JSON array of pairs."""
+        return dumps(self.ontology_entity_descriptions)
 
     def list_entities(self) -> List[EntitySchema]:
         """List all entities in the ontology."""
@@ -145,6 +227,21 @@ def load_tools(tool_modules: Optional[Sequence[str]] = None) -> Dict[str, ToolIn
 def build_semantic_layer(
     ontology_path: str | Path,
     tool_modules: Optional[Sequence[str]] = None,
+) -> SemanticLayer:
+    """
+    Build the semantic layer for an ontology and its tool modules.
+
+    The result is built once per process for each (ontology, tool modules) pair
+    and shared by every caller; treat it as read-only.
+    """
+    return _build_semantic_layer(
+        Path(ontology_path).resolve(), tuple(tool_modules or DEFAULT_TOOL_MODULES)
+    )
+
+
+@cache
+def _build_semantic_layer(
+    ontology_path: Path, tool_modules: Tuple[str, ...]
 ) -> SemanticLayer:
     # 1) Load ontology
     entities, relations = load_ontology(ontology_path)
@@ -173,10 +270,10 @@ def build_semantic_layer(
 
 semantic_layer = build_semantic_layer(ONTOLOGY_SOURCE_PATH)
 
-# Build ontology entity descriptions list
-ontology_entities = [
-    (name, ent.description) for name, ent in semantic_layer.entities.items()
-]
+# Ontology entity descriptions, (name, description) tuples
+ontology_entities = semantic_layer.ontology_entity_descriptions
+# The same, pre-rendered once as a compact JSON array for prompts
+ontology_entities_json = semantic_layer.ontology_entity_table
 
 
 if __name__ == "__main__":
@@ -1,21 +1,31 @@
-import yaml
 import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import repeat
 from pathlib import Path
+from typing import Optional
 
+from agent_poc.utils.yaml_loader import load_yaml_cached
 
+_WORD_SEPARATORS = re.compile(r"[_\-\s]+")
+
+_PRIMITIVES = {
+    "string": "str",
+    "integer": "int",
+    "float": "float",
+    "boolean": "bool",
+    "datetime": "datetime.datetime",
+}
+
+
+# Entity and attribute names recur across the generated code
+@lru_cache(maxsize=512)
 def pascal_case(name: str) -> str:
-    return "".join(word.capitalize() for word in re.split(r"[_\-\s]+", name))
+    return "".join(word.capitalize() for word in _WORD_SEPARATORS.split(name))
 
 
 def python_primitive(yaml_type: str) -> str:
-    mapping = {
-        "string": "str",
-        "integer": "int",
-        "float": "float",
-        "boolean": "bool",
-        "datetime": "datetime.datetime",
-    }
-    return mapping.get(yaml_type, "Any")
+    return _PRIMITIVES.get(yaml_type, "Any")
 
 
 class ModelGenerator:
@@ -139,37 +149,54 @@ class {entity_class_name}(BaseModel):
 {chr(10).join(root_fields)}
 """
 
-        file_code = """
+        parts = [
+            """
 from pydantic import BaseModel, Field
 from enum import Enum
 import datetime
 from typing import Optional, List, Dict, Any
 """
-
-        for enum_code in nested_enums:
-            file_code += "\n" + enum_code + "\n"
-
-        for struct_code in nested_structs:
-            file_code += "\n" + struct_code + "\n"
-
-        file_code += "\n" + root_model + "\n"
-        return file_code
+        ]
+        # Enums, then structs, then the root model; joined once at the end
+        for code in (*nested_enums, *nested_structs, root_model):
+            parts.append("\n" + code + "\n")
+        return "".join(parts)
 
     # --------------------------
     # Runner
     # --------------------------
-    def run(self):
-        src_dir = Path("src/agent_poc/semantic_layer/ontology_data")
-        out_dir = Path("src/agent_poc/semantic_layer/generated_models")
+    def generate_file(self, yaml_file: Path, out_dir: Path) -> Path:
+        entity_def = load_yaml_cached(yaml_file)
+        entity_name = entity_def["name"]
+        code = self.generate_entity_model(entity_name, entity_def)
+        out_file = out_dir / f"{entity_name.lower()}.py"
+        out_file.write_text(code)
+        return out_file
+
+    def run(
+        self,
+        src_dir: Path = Path("src/agent_poc/semantic_layer/ontology_data"),
+        out_dir: Path = Path("src/agent_poc/semantic_layer/generated_models"),
+        max_workers: Optional[int] = None,
+    ):
+        """
+        Generate one model module per entity YAML.
+
+        With `max_workers` > 1 the files are generated in that many processes;
+        only worth it for large ontologies, as each worker starts an interpreter.
+        """
         out_dir.mkdir(exist_ok=True)
+        yaml_files = sorted(src_dir.glob("*.yaml"))
+
+        if max_workers is not None and max_workers > 1 and len(yaml_files) > 1:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                out_files = list(
+                    pool.map(self.generate_file, yaml_files, repeat(out_dir))
+                )
+        else:
+            out_files = [self.generate_file(f, out_dir) for f in yaml_files]
 
-        for yaml_file in src_dir.glob("*.yaml"):
-            raw = yaml.safe_load(open(yaml_file))
-            entity_def = raw
-            entity_name = entity_def["name"]
-            code = self.generate_entity_model(entity_name, entity_def)
-            out_file = out_dir / f"{entity_name.lower()}.py"
-            out_file.write_text(code)
+        for out_file in out_files:
             print(f"Generated: {out_file}")
 
 
@@ -1,10 +1,11 @@
 from __future__ import annotations
 
+import sys
 from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Any, Dict, List, Tuple
 
-import yaml
+from agent_poc.utils.yaml_loader import load_yaml_cached
 
 
 def _extract_entities_from_payload(
@@ -63,16 +64,24 @@ class EntitySchema:
     relationships: Dict[str, RelationshipSpec] = field(default_factory=dict)
 
 
-@dataclass
+@dataclass(frozen=True, slots=True, weakref_slot=True)
 class RelationSchema:
     name: str
     from_entity: str
     to_entity: str
     description: str = ""
+    # (from, relation_name, to), built once; entity and relation names are
+    # interned so key hashing/comparison in relation lookups is cheap
+    key: RelationKey = field(init=False, repr=False, compare=False)
 
-    @property
-    def key(self) -> RelationKey:
-        return (self.from_entity, self.name, self.to_entity)
+    def __post_init__(self) -> None:
+        name = sys.intern(self.name)
+        from_entity = sys.intern(self.from_entity)
+        to_entity = sys.intern(self.to_entity)
+        object.__setattr__(self, "name", name)
+        object.__setattr__(self, "from_entity", from_entity)
+        object.__setattr__(self, "to_entity", to_entity)
+        object.__setattr__(self, "key", (from_entity, name, to_entity))
 
 
 def load_ontology(
@@ -96,7 +105,7 @@ def load_ontology(
             )
 
         for yaml_path in yaml_files:
-            raw = yaml.safe_load(yaml_path.read_text(encoding="utf-8")) or {}
+            raw = load_yaml_cached(yaml_path) or {}
             extracted = _extract_entities_from_payload(raw, str(yaml_path))
             for entity_name, cfg in extracted.items():
                 if entity_name in entities_payload:
@@ -108,7 +117,7 @@ def load_ontology(
         data = {"entities": entities_payload}
         ont = data
     else:
-        data = yaml.safe_load(path.read_text(encoding="utf-8")) or {}
+        data = load_yaml_cached(path) or {}
 
         # Accept both previous schema (top-level 'ontology') and new root-level 'entities'
         if "ontology" in data:
@@ -36,6 +36,7 @@ def semantic_tool(
                     "default": param.default
                     if param.default != inspect._empty
                     else None,
+                    "required": param.default is inspect._empty,
                 }
             )
 
@@ -0,0 +1,23 @@
+from typing import Any, Callable, Iterable, List
+
+
+def canonicalize(obj: Any) -> Any:
+    """
+    Recursively rebuild dicts with sorted keys so equivalent inputs render to
+    byte-identical prompts (and hit DSPy's exact-match LM cache).
+
+    List order is preserved because it can be meaningful (e.g. plan steps);
+    use sort_items for lists whose order does not matter.
+    """
+    if isinstance(obj, dict):
+        return {k: canonicalize(obj[k]) for k in sorted(obj, key=str)}
+    if isinstance(obj, (list, tuple)):
+        return [canonicalize(v) for v in obj]
+    return obj
+
+
+def sort_items(
+    items: Iterable[Any], key: Callable[[Any], Any] = lambda item: item["name"]
+) -> List[Any]:
+    """Canonicalize an unordered collection of dicts, sorted by `key` (default: name)."""
+    return sorted((canonicalize(item) for item in items), key=key)
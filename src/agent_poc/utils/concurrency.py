@@ -0,0 +1,16 @@
+import contextvars
+from concurrent.futures import Executor, Future
+from typing import Any, Callable
+
+
+def submit_in_context(
+    pool: Executor, fn: Callable[..., Any], *args: Any, **kwargs: Any
+) -> Future:
+    """
+    `pool.submit(fn, *args, **kwargs)`, with fn run in a copy of the caller's
+    context.
+
+    DSPy keeps per-call overrides such as `dspy.context(lm=...)` in context
+    variables, which worker threads do not inherit on their own.
+    """
+    return pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
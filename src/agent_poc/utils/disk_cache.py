@@ -0,0 +1,36 @@
+import os
+import threading
+from typing import Optional
+
+try:
+    import diskcache
+except ImportError:  # optional; persistent caching is simply unavailable
+    diskcache = None
+
+# Directory of the persistent cache. Caching is opt-in: nothing is written to
+# disk unless this is set.
+CACHE_DIR_ENV = "AGENT_POC_CACHE"
+# Set to "1" to bypass the persistent cache even when a directory is configured
+# (e.g. in evaluation loops that must always hit the LLM).
+CACHE_DISABLE_ENV = "AGENT_POC_CACHE_DISABLE"
+
+_DISK_CACHES: dict = {}
+_DISK_CACHES_LOCK = threading.Lock()
+
+
+def get_disk_cache() -> Optional["diskcache.Cache"]:
+    """Return the configured persistent cache, or None when caching is off."""
+    directory = os.environ.get(CACHE_DIR_ENV)
+    if not directory or diskcache is None:
+        return None
+    if os.environ.get(CACHE_DISABLE_ENV) == "1":
+        return None
+
+    directory = os.path.expanduser(directory)
+    cache = _DISK_CACHES.get(directory)
+    if cache is None:
+        with _DISK_CACHES_LOCK:
+            cache = _DISK_CACHES.get(directory)
+            if cache is None:
+                cache = _DISK_CACHES[directory] = diskcache.Cache(directory)
+    return cache
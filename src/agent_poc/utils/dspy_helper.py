@@ -12,6 +12,11 @@ DATABRICKS_HOST = os.getenv("DATABRICKS_HOST")
 DATABRICKS_LLM_ENDPOINT = os.getenv("DATABRICKS_LLM_ENDPOINT")
 DATABRICKS_TOKEN = os.getenv("DATABRICKS_TOKEN")
 
+# Optional small/local model for LLM-as-judge metrics, e.g.
+# "ollama_chat/llama3.1:8b-instruct-q4_K_M"; unset keeps judges on the main LM
+JUDGE_LM_MODEL = os.getenv("JUDGE_LM_MODEL")
+JUDGE_LM_API_BASE = os.getenv("JUDGE_LM_API_BASE", "http://localhost:11434")
+
 
 class DspyHelper:
     @classmethod
@@ -39,3 +44,17 @@ class DspyHelper:
         )
         dspy.configure(lm=lm)
         logger.info("Dspy initialized with Kimi LLM endpoint")
+
+    @classmethod
+    def init_judge(cls):
+        """
+        Return the LM configured for judge prompts, or None to use the main LM.
+
+        Judges run on `JUDGE_LM_MODEL` (served at `JUDGE_LM_API_BASE`) when set.
+        """
+        if not JUDGE_LM_MODEL:
+            return None
+
+        lm = dspy.LM(model=JUDGE_LM_MODEL, api_base=JUDGE_LM_API_BASE)
+        logger.info("Dspy judge LM: %s", JUDGE_LM_MODEL)
+        return lm
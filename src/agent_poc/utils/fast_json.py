@@ -0,0 +1,28 @@
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # optional; fall back to the stdlib encoder
+    orjson = None
+
+
+def dumps(obj: Any, sort_keys: bool = False) -> str:
+    """
+    Compact JSON text, via orjson when available.
+
+    Non-JSON values are rendered with str() (like json.dumps(default=str)), so
+    this is also safe for hashing arbitrary inputs into cache keys.
+    """
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=str, option=option).decode("utf-8")
+    return json.dumps(
+        obj,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        sort_keys=sort_keys,
+        default=str,
+    )
@@ -0,0 +1,115 @@
+import functools
+import hashlib
+from typing import Any, Callable, Optional, Tuple
+
+import dspy
+
+try:
+    import xxhash
+except ImportError:  # optional; fall back to hashlib
+    xxhash = None
+
+from agent_poc.utils.canonical import canonicalize
+from agent_poc.utils.disk_cache import (  # noqa: F401 - re-exported
+    CACHE_DIR_ENV,
+    CACHE_DISABLE_ENV,
+    get_disk_cache,
+)
+from agent_poc.utils.fast_json import dumps
+
+DEFAULT_TTL = 3600.0
+
+
+def make_cache_key(namespace: str, inputs: Any) -> str:
+    """Stable hash of the LLM inputs, the configured model and a namespace."""
+    lm = dspy.settings.lm
+    payload = dumps(
+        {
+            "ns": namespace,
+            "lm": getattr(lm, "model", None),
+            "in": canonicalize(inputs),
+        },
+        sort_keys=True,
+    )
+    data = payload.encode("utf-8")
+    # Same hashing scheme as DSPy's own LM cache; only needs to be fast and stable
+    digest = (
+        xxhash.xxh64(data).hexdigest()
+        if xxhash is not None
+        else hashlib.blake2b(data).hexdigest()
+    )
+    return f"{namespace}:{digest}"
+
+
+def cache_llm(
+    namespace: str, ttl: Optional[float] = DEFAULT_TTL
+) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """
+    Persist the (picklable) return value of an LLM-calling function on disk.
+
+    Only active when AGENT_POC_CACHE points to a cache directory (and
+    AGENT_POC_CACHE_DISABLE is not "1"); otherwise the function is simply
+    called.
+
+    The key is built from the keyword arguments only, so methods can be
+    decorated as long as their inputs are passed by keyword. `self` is not
+    part of the key: pass whatever instance state affects the result (e.g. a
+    StateFingerprint of the predictor, behaviour flags) as keywords too.
+    `ttl` is in seconds; None keeps entries forever.
+    """
+
+    def decorator(fn: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            cache = get_disk_cache()
+            if cache is None:
+                return fn(*args, **kwargs)
+
+            key = make_cache_key(namespace, kwargs)
+            value = cache.get(key)
+            if value is not None:
+                return value
+
+            value = fn(*args, **kwargs)
+            cache.set(key, value, expire=ttl)
+            return value
+
+        return wrapper
+
+    return decorator
+
+
+class StateFingerprint:
+    """
+    A DSPy module's `dump_state()` (instructions, demos, LM) as canonical JSON,
+    for keying cached LLM results to the program that produced them.
+
+    Serializing the demos on every call would cost about as much as a cache hit
+    saves, so it is only redone when a predictor's signature, demos list or LM
+    is replaced, or its demos list changes length, as load_state and the
+    optimizers do; call reset() after any other in-place change.
+    """
+
+    def __init__(self) -> None:
+        self._source: Optional[Tuple[Any, ...]] = None
+        self._value = ""
+
+    def reset(self) -> None:
+        self._source = None
+
+    def __call__(self, module: Any) -> str:
+        source = tuple(
+            (p.signature, p.demos, p.lm, len(p.demos)) for p in module.predictors()
+        )
+        previous = self._source
+        if previous is None or not _same_sources(previous, source):
+            self._value = dumps(module.dump_state(), sort_keys=True)
+            self._source = source
+        return self._value
+
+
+def _same_sources(a: Tuple[Any, ...], b: Tuple[Any, ...]) -> bool:
+    return len(a) == len(b) and all(
+        x[0] is y[0] and x[1] is y[1] and x[2] is y[2] and x[3] == y[3]
+        for x, y in zip(a, b)
+    )
@@ -0,0 +1,148 @@
+import re
+import threading
+import time
+import zlib
+from typing import Any, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+# Character n-gram size and number of hashing buckets of the query embedding
+_NGRAM = 3
+_DIM = 1024
+
+_WORD = re.compile(r"[a-z0-9]+")
+# Words that flip or reorder a query's answer while barely moving its trigram
+# embedding ("most"/"fewest", "with"/"without", "July"/"June")
+_DECISIVE_WORDS = frozenset(
+    """
+    not no nor never none neither without except excluding exclude
+    most least more less fewer fewest max min maximum minimum highest lowest
+    largest smallest biggest longest shortest oldest newest earliest latest
+    first last top bottom above below over under before after between
+    greater within
+    january february march april may june july august september october
+    november december jan feb mar apr jun jul aug sep sept oct nov dec
+    monday tuesday wednesday thursday friday saturday sunday
+    today yesterday tomorrow
+    """.split()
+)
+
+
+def embed_text(text: str, dim: int = _DIM) -> np.ndarray:
+    """
+    Cheap, dependency-free query embedding: hashed character trigrams,
+    L2-normalized. Good enough to tell "...out of Sydney..." and
+    "...out of Melbourne..." apart from unrelated questions; it is not a
+    semantic model.
+    """
+    padded = f" {' '.join(text.lower().split())} "
+    grams = [padded[i : i + _NGRAM] for i in range(len(padded) - _NGRAM + 1)]
+    # crc32 rather than hash(): str hashing is salted per process
+    buckets = [zlib.crc32(g.encode("utf-8")) % dim for g in grams]
+    vec = np.bincount(buckets, minlength=dim).astype(np.float32)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+def decisive_tokens(text: str) -> Tuple[str, ...]:
+    """
+    The tokens of `text` that must match exactly for two queries to share an
+    answer: anything containing a digit (dates, counts, container IDs) and
+    negation, comparative and calendar words, in order of appearance.
+    """
+    words = _WORD.findall(text.casefold().replace("n't", " not"))
+    return tuple(w for w in words if w in _DECISIVE_WORDS or not w.isalpha())
+
+
+class SemanticCache:
+    """
+    In-memory cache keyed by text similarity instead of exact text.
+
+    get() returns the value stored for the most similar text whose cosine
+    similarity is at least `threshold`, among entries with the same `bucket`
+    (any hashable that must match exactly, e.g. a set of relation keys).
+    With `exact_literals` (the default), the texts' decisive_tokens() must
+    also be identical, so a near-duplicate query with another date, ID or a
+    negation never hits.
+    Embeddings live in one float32 matrix so a lookup is a single
+    matrix-vector product. Entries expire after `ttl` seconds (None keeps
+    them); the oldest entry is evicted once `max_entries` is reached.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.92,
+        ttl: Optional[float] = 7 * 24 * 3600,
+        max_entries: int = 1024,
+        dim: int = _DIM,
+        exact_literals: bool = True,
+    ) -> None:
+        self.threshold = threshold
+        self.exact_literals = exact_literals
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._dim = dim
+        self._embeddings = np.empty((0, dim), dtype=np.float32)
+        self._created = np.empty(0, dtype=np.float64)
+        self._buckets: List[Hashable] = []
+        self._literals: List[Tuple[str, ...]] = []
+        self._values: List[Any] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, text: str, bucket: Hashable = None) -> Optional[Any]:
+        """Value of the most similar live entry above the threshold, else None."""
+        literals = decisive_tokens(text) if self.exact_literals else ()
+        with self._lock:
+            best = None
+            if self._values:
+                scores = self._embeddings @ embed_text(text, self._dim)
+                if self.ttl is not None:
+                    scores[self._created < time.time() - self.ttl] = -1.0
+                best_score = self.threshold
+                for i in np.flatnonzero(scores >= self.threshold):
+                    if (
+                        scores[i] >= best_score
+                        and self._buckets[i] == bucket
+                        and self._literals[i] == literals
+                    ):
+                        best, best_score = i, scores[i]
+
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return self._values[best]
+
+    def put(self, text: str, value: Any, bucket: Hashable = None) -> None:
+        """Store value for text; expired entries and the oldest overflow are dropped."""
+        vec = embed_text(text, self._dim)[None, :]
+        literals = decisive_tokens(text) if self.exact_literals else ()
+        with self._lock:
+            keep = np.ones(len(self._values), dtype=bool)
+            if self.ttl is not None:
+                keep &= self._created >= time.time() - self.ttl
+            overflow = int(keep.sum()) + 1 - self.max_entries
+            if overflow > 0:
+                keep[np.flatnonzero(keep)[:overflow]] = False
+            if not keep.all():
+                self._embeddings = self._embeddings[keep]
+                self._created = self._created[keep]
+                self._buckets = [b for b, k in zip(self._buckets, keep) if k]
+                self._literals = [t for t, k in zip(self._literals, keep) if k]
+                self._values = [v for v, k in zip(self._values, keep) if k]
+
+            self._embeddings = np.vstack([self._embeddings, vec])
+            self._created = np.append(self._created, time.time())
+            self._buckets.append(bucket)
+            self._literals.append(literals)
+            self._values.append(value)
@@ -0,0 +1,37 @@
+from pathlib import Path
+from typing import Any
+
+import yaml
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:  # optional; fall back to the pure-Python parser
+    from yaml import SafeLoader
+
+from agent_poc.utils.disk_cache import get_disk_cache
+
+
+def load_yaml(path: str | Path) -> Any:
+    """Parse a YAML file (bytes in: the parser detects the encoding itself)."""
+    return yaml.load(Path(path).read_bytes(), Loader=SafeLoader)
+
+
+def load_yaml_cached(path: str | Path) -> Any:
+    """
+    `load_yaml`, served from the persistent cache (when configured) until the
+    file's modification time changes.
+    """
+    path = Path(path)
+    cache = get_disk_cache()
+    if cache is None:
+        return load_yaml(path)
+
+    key = f"yaml:{path.resolve()}"
+    mtime = path.stat().st_mtime
+    cached = cache.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    data = load_yaml(path)
+    cache.set(key, (mtime, data))
+    return data
@@ -0,0 +1,19 @@
+"""Tests for input canonicalization used ahead of LLM calls."""
+
+import json
+
+from agent_poc.utils.canonical import canonicalize, sort_items
+
+
+def test_canonicalize_sorts_keys_but_keeps_list_order():
+    a = {"b": 1, "a": [{"y": 2, "x": 1}, {"k": 0}]}
+    b = {"a": [{"x": 1, "y": 2}, {"k": 0}], "b": 1}
+
+    assert json.dumps(canonicalize(a)) == json.dumps(canonicalize(b))
+    assert canonicalize([3, 1, 2]) == [3, 1, 2]
+
+
+def test_sort_items_orders_by_name():
+    items = [{"name": "b"}, {"name": "a"}]
+
+    assert [item["name"] for item in sort_items(items)] == ["a", "b"]
@@ -0,0 +1,164 @@
+"""Tests for the plan-to-Python code generator."""
+
+from types import SimpleNamespace
+
+from agent_poc.modules.planning.code_generation import PythonCodeGen
+from agent_poc.utils.llm_cache import CACHE_DIR_ENV
+
+PLAN = [
+    {
+        "id": 1,
+        "tool": "get_terminals_by_city",
+        "inputs": {"city_name": "Sydney"},
+        "output": "terminals",
+    },
+    {
+        "id": 2,
+        "tool": "get_facility_details",
+        "inputs": {"facility_id": "terminals[*].facility_id"},
+        "output": "facilities",
+    },
+]
+TOOLS = {
+    "get_terminals_by_city": {"name": "get_terminals_by_city"},
+    "get_facility_details": {"name": "get_facility_details"},
+}
+CODE = """from agent_poc.semantic_layer.tools import (
+    get_terminals_by_city,
+    get_facility_details,
+)
+def run():
+    terminals = get_terminals_by_city(city_name="Sydney")
+    facilities = []
+    for item in terminals:
+        facilities.append(get_facility_details(facility_id=item.facility_id))
+    return facilities"""
+
+
+class _CountingGenerator:
+    """Stand-in for the dspy predictor that records how often it is called."""
+
+    def __init__(self, python_code: str) -> None:
+        self.python_code = python_code
+        self.calls = 0
+
+    def __call__(self, **kwargs):
+        self.calls += 1
+        return SimpleNamespace(python_code=self.python_code)
+
+    def predictors(self):
+        return []
+
+    def dump_state(self):
+        return {"python_code": self.python_code}
+
+
+def test_forward_serves_repeated_inputs_from_cache():
+    codegen = PythonCodeGen()
+    codegen.generator = _CountingGenerator(f"```python\n{CODE}\n```")
+
+    first = codegen(plan=PLAN, tools=TOOLS, model_schemas={})
+    second = codegen(plan=PLAN, tools=TOOLS, model_schemas={})
+
+    assert first["python_code"] == CODE
+    assert second["python_code"] == CODE
+    assert codegen.generator.calls == 1
+
+
+def test_differently_configured_instances_do_not_share_disk_entries(
+    tmp_path, monkeypatch
+):
+    monkeypatch.setenv(CACHE_DIR_ENV, str(tmp_path))
+    fenced = f"```python\n{CODE}\n```"
+
+    stripping = PythonCodeGen(validate_syntax=False)
+    stripping.generator = _CountingGenerator(fenced)
+    raw = PythonCodeGen(validate_syntax=False, strip_markdown_fences=False)
+    raw.generator = _CountingGenerator(fenced)
+    other_program = PythonCodeGen(validate_syntax=False)
+    other_program.generator = _CountingGenerator(f"{CODE}\n")
+
+    assert stripping(plan=PLAN, tools=TOOLS, model_schemas={})["python_code"] == CODE
+    assert raw(plan=PLAN, tools=TOOLS, model_schemas={})["python_code"] == fenced
+    other_program(plan=PLAN, tools=TOOLS, model_schemas={})
+    assert raw.generator.calls == 1
+    assert other_program.generator.calls == 1
+
+
+def test_cache_evicts_least_recently_used_and_expired_entries(monkeypatch):
+    codegen = PythonCodeGen(cache_ttl=10, cache_max_entries=2)
+    now = [0.0]
+    monkeypatch.setattr(
+        "agent_poc.modules.planning.code_generation.time.monotonic", lambda: now[0]
+    )
+    output = {"python_code": CODE, "python_code_obj": None}
+
+    codegen._cache_put("a", output)
+    codegen._cache_put("b", output)
+    codegen._cache_get("a")
+    codegen._cache_put("c", output)
+    assert list(codegen._cache) == ["a", "c"]
+
+    now[0] = 20.0
+    codegen._cache_put("d", output)
+    assert list(codegen._cache) == ["d"]
+
+
+def test_postprocess_strips_markdown_fences():
+    codegen = PythonCodeGen()
+
+    assert codegen._postprocess_code("```python\nx = 1\n```") == "x = 1"
+    assert codegen._postprocess_code("```\nx = 1\n```") == "x = 1"
+    assert codegen._postprocess_code("Here:\n```python\nx = 1\n```\n") == "x = 1"
+    assert codegen._postprocess_code("x = 1") == "x = 1"
+
+
+def test_forward_returns_compiled_code_object():
+    codegen = PythonCodeGen()
+    codegen.generator = _CountingGenerator(CODE)
+
+    result = codegen(plan=PLAN, tools=TOOLS, model_schemas={})
+
+    namespace = {}
+    exec(result["python_code_obj"], namespace)
+    assert callable(namespace["run"])
+
+
+def test_single_step_literal_plan_skips_llm():
+    codegen = PythonCodeGen()
+    codegen.generator = _CountingGenerator("")
+    tools = {
+        "get_terminals_by_city": {
+            "name": "get_terminals_by_city",
+            "input_schema": [{"name": "city_name", "type": "str"}],
+        }
+    }
+
+    result = codegen(plan=PLAN[:1], tools=tools, model_schemas={})
+
+    assert codegen.generator.calls == 0
+    assert (
+        "terminals = get_terminals_by_city(city_name='Sydney')"
+        in (result["python_code"])
+    )
+    assert result["python_code"].endswith("return terminals")
+
+
+def test_single_step_plan_missing_a_required_parameter_uses_llm():
+    codegen = PythonCodeGen()
+    codegen.generator = _CountingGenerator(CODE)
+    tools = {
+        "get_terminals_by_city": {
+            "name": "get_terminals_by_city",
+            "input_schema": [
+                {"name": "city_name", "type": "str", "required": True},
+                {"name": "country", "type": "str", "required": True},
+                {"name": "limit", "type": "int", "default": 10, "required": False},
+            ],
+        }
+    }
+
+    result = codegen(plan=PLAN[:1], tools=tools, model_schemas={})
+
+    assert codegen.generator.calls == 1
+    assert result["python_code"] == CODE
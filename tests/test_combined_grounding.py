@@ -0,0 +1,43 @@
+"""Tests for the single-call semantic grounding path."""
+
+import dspy
+from dspy.utils import DummyLM
+
+from agent_poc.modules.semantic_grounding.pipeline import run_combined_grounding
+from agent_poc.semantic_layer.engine import ontology_entities_json
+
+
+def test_combined_grounding_uses_one_llm_call():
+    lm = DummyLM(
+        [
+            {
+                "entities": ["City"],
+                "intent": "list terminals in city",
+                "relevant": [
+                    {
+                        "source": "City",
+                        "name": "has_facility",
+                        "target": "Facility",
+                        "relevant": "yes",
+                    },
+                    # not reachable from the query's entities
+                    {
+                        "source": "Shipment",
+                        "name": "has_container",
+                        "target": "Container",
+                        "relevant": "yes",
+                    },
+                ],
+            }
+        ]
+    )
+
+    with dspy.context(lm=lm):
+        entities, intent, expanded, active = run_combined_grounding(
+            query="Terminals in Sydney?", ontology_entities=ontology_entities_json
+        )
+
+    assert len(lm.history) == 1
+    assert (entities, intent) == (["City"], "list terminals in city")
+    assert expanded == ["City", "Facility"]
+    assert active == [("City", "has_facility", "Facility")]
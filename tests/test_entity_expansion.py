@@ -0,0 +1,17 @@
+"""Tests for deterministic entity expansion."""
+
+from agent_poc.modules.semantic_grounding.entity_expansion import expand_entities
+
+
+def test_expansion_follows_active_relations_in_both_directions():
+    relations = {
+        ("Facility", "occurs_at", "ContainerEvent"): "yes",
+        ("City", "has_facility", "Facility"): "YES",
+        ("Shipment", "has_container", "Container"): "no",
+        ("Vessel", "calls_at", "Port"): "yes",
+    }
+
+    expanded, active = expand_entities([{"type": "ContainerEvent"}], relations)
+
+    assert expanded == ["City", "ContainerEvent", "Facility"]
+    assert len(active) == 3
@@ -0,0 +1,22 @@
+"""Tests for literal entity mention detection."""
+
+from agent_poc.modules.query_understanding.entity_matcher import EntityMatcher
+from agent_poc.semantic_layer.engine import semantic_layer
+
+matcher = EntityMatcher.from_entities(semantic_layer.entities.values())
+
+
+def test_match_finds_synonyms_plurals_and_identifiers():
+    assert matcher.match("How many units are linked to booking 250733952?") == [
+        "Container",
+        "Shipment",
+    ]
+    assert matcher.match("List the terminals") == ["Facility"]
+    assert matcher.match("Where is HASU1533926?") == ["Container"]
+    assert matcher.match("What is the weight of a 40 DRY?") == []
+
+
+def test_coverage_counts_content_words_inside_mentions():
+    assert matcher.coverage("Where is my container HASU1533926") == 1.0
+    assert matcher.coverage("How many terminals are there in Delhi?") == 0.5
+    assert matcher.coverage("Where is it?") == 0.0
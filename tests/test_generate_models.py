@@ -0,0 +1,37 @@
+"""Tests for the Pydantic model generator."""
+
+from agent_poc.semantic_layer.generate_models import ModelGenerator
+
+
+def test_generated_code_orders_enums_structs_then_root_model():
+    entity_def = {
+        "description": "A thing.",
+        "attributes": {
+            "thing_id": {"type": "string", "primary_key": True},
+            "status": {"type": "enum", "values": ["open", "closed"]},
+            "size": {"type": "object", "properties": {"length": {"type": "float"}}},
+        },
+    }
+
+    code = ModelGenerator().generate_entity_model("thing", entity_def)
+
+    assert code.index("class StatusEnum(Enum)") < code.index("class SizeStruct(")
+    assert code.index("class SizeStruct(") < code.index("class Thing(BaseModel)")
+    assert "    thing_id: str = Field(..., description='')" in code
+    compile(code, "thing.py", "exec")
+
+
+def test_run_generates_the_same_files_in_worker_processes(tmp_path):
+    src_dir = tmp_path / "ontology"
+    src_dir.mkdir()
+    for name in ("alpha", "beta", "gamma"):
+        (src_dir / f"{name}.yaml").write_text(
+            f"name: {name}\nattributes:\n  {name}_id:\n    type: string\n"
+        )
+
+    ModelGenerator().run(src_dir, tmp_path / "serial")
+    ModelGenerator().run(src_dir, tmp_path / "parallel", max_workers=2)
+
+    for name in ("alpha", "beta", "gamma"):
+        serial = (tmp_path / "serial" / f"{name}.py").read_text()
+        assert serial == (tmp_path / "parallel" / f"{name}.py").read_text()
@@ -0,0 +1,37 @@
+"""Tests for the persistent LLM response cache."""
+
+from agent_poc.utils.llm_cache import CACHE_DIR_ENV, CACHE_DISABLE_ENV, cache_llm
+
+
+def _counting(calls):
+    @cache_llm("test")
+    def generate(*, prompt):
+        calls.append(prompt)
+        return prompt.upper()
+
+    return generate
+
+
+def test_cache_llm_persists_results(tmp_path, monkeypatch):
+    monkeypatch.setenv(CACHE_DIR_ENV, str(tmp_path))
+    calls = []
+    generate = _counting(calls)
+
+    assert generate(prompt="a") == "A"
+    assert generate(prompt="a") == "A"
+    assert _counting(calls)(prompt="a") == "A"  # a fresh function, same store
+    assert calls == ["a"]
+
+
+def test_cache_llm_is_bypassed_unless_configured(tmp_path, monkeypatch):
+    monkeypatch.delenv(CACHE_DIR_ENV, raising=False)
+    calls = []
+    generate = _counting(calls)
+    generate(prompt="a")
+    generate(prompt="a")
+
+    monkeypatch.setenv(CACHE_DIR_ENV, str(tmp_path))
+    monkeypatch.setenv(CACHE_DISABLE_ENV, "1")
+    generate(prompt="a")
+
+    assert calls == ["a", "a", "a"]
@@ -0,0 +1,153 @@
+"""Tests for the similarity-based plan template cache and plan skeletons."""
+
+import asyncio
+
+from agent_poc.modules.planning import pipeline
+from agent_poc.modules.planning.plan_cache import (
+    PlanSkeletonCache,
+    PlanTemplateCache,
+    fill_skeleton_code,
+    plan_skeleton,
+)
+
+STEPS = [{"id": 1, "tool": "get_terminals_by_city", "inputs": {}, "output": "t"}]
+TOOLS = ["get_terminals_by_city", "get_facility_details"]
+
+
+def test_lookup_matches_similar_query_with_same_tools():
+    cache = PlanTemplateCache(threshold=0.7)
+    cache.add(
+        "How many containers were gated out of Sydney terminal on 20 July 2025",
+        "count gate out events",
+        TOOLS,
+        STEPS,
+    )
+
+    similar = "How many containers were gated out of Melbourne terminal on 21 July 2025"
+    assert cache.lookup(similar, "count gate out events", reversed(TOOLS)) is STEPS
+    assert cache.lookup(similar, "count gate out events", TOOLS[:1]) is None
+    assert cache.lookup("Where is container TEMU9876543?", "locate", TOOLS) is None
+
+
+def test_add_evicts_oldest_entry_when_full():
+    cache = PlanTemplateCache(max_entries=2)
+    for query in ("a b c", "d e f", "g h i"):
+        cache.add(query, "intent", TOOLS, STEPS)
+
+    assert len(cache) == 2
+    assert cache.lookup("a b c", "intent", TOOLS) is None
+    assert cache.lookup("g h i", "intent", TOOLS) is STEPS
+
+
+def _plan(city, date):
+    return [
+        {
+            "id": 1,
+            "tool": "get_terminals_by_city",
+            "inputs": {"city_name": city},
+            "output": "terminals",
+        },
+        {
+            "id": 2,
+            "tool": "get_events_by_facility",
+            "inputs": {"facility_id": "terminals[*].facility_id", "date": date},
+            "output": "events",
+        },
+    ]
+
+
+def test_plan_skeleton_replaces_only_literals():
+    skeleton, literals = plan_skeleton(_plan("Sydney", "2025-07-20"))
+
+    assert literals == ["Sydney", "2025-07-20"]
+    assert skeleton[0]["inputs"] == {"city_name": "__literal_0__"}
+    assert skeleton[1]["inputs"]["facility_id"] == "terminals[*].facility_id"
+    assert skeleton == plan_skeleton(_plan("Melbourne", "2025-07-21"))[0]
+
+
+def test_fill_skeleton_code_requires_every_placeholder():
+    code = "x = f(a='__literal_0__', b=\"__literal_1__\")"
+
+    assert fill_skeleton_code(code, ["Syd'ney", 3]) == 'x = f(a="Syd\'ney", b=3)'
+    assert fill_skeleton_code("x = f(a='__literal_0__')", ["a", "b"]) is None
+
+
+def test_plan_skeleton_cache_evicts_least_recently_used_intent():
+    cache = PlanSkeletonCache(max_entries=2)
+    cache.put("a", STEPS)
+    cache.put("b", STEPS)
+    cache.get("a")
+    cache.put("c", STEPS)
+
+    assert len(cache) == 2
+    assert cache.get("b") is None and cache.get("a") is STEPS
+
+
+def test_speculative_planning_reuses_code_for_the_same_skeleton(monkeypatch):
+    monkeypatch.setattr(pipeline, "_PLAN_SKELETONS", PlanSkeletonCache())
+    plans = iter([_plan("Sydney", "2025-07-20"), _plan("Melbourne", "2025-07-21")])
+    codegen_plans = []
+
+    def planner(**_):
+        return {"steps": next(plans)}
+
+    def codegen(plan, tools, model_schemas):
+        codegen_plans.append(plan)
+        literals = [v for step in plan for v in step["inputs"].values()]
+        return {"python_code": f"run({literals[0]!r}, {literals[2]!r})"}
+
+    def plan_once():
+        return asyncio.run(
+            pipeline.arun_planning(
+                "q",
+                "count gate outs",
+                [{"name": "Sydney"}],
+                ["City", "Facility"],
+                [],
+                planner=planner,
+                codegen=codegen,
+                speculative=True,
+            )
+        )
+
+    plan_once()
+    _, code = plan_once()
+
+    assert code == "run('Melbourne', '2025-07-21')"
+    # the real first plan, then the skeleton; no codegen for the second plan
+    assert len(codegen_plans) == 2
+    assert codegen_plans[1][0]["inputs"] == {"city_name": "__literal_0__"}
+
+
+def test_failed_speculative_codegen_falls_back_to_the_actual_plan(monkeypatch, caplog):
+    monkeypatch.setattr(pipeline, "_PLAN_SKELETONS", PlanSkeletonCache())
+    plans = iter([_plan("Sydney", "2025-07-20"), _plan("Melbourne", "2025-07-21")])
+
+    def planner(**_):
+        return {"steps": next(plans)}
+
+    def codegen(plan, tools, model_schemas):
+        literals = [v for step in plan for v in step["inputs"].values()]
+        if literals[0] == "__literal_0__":
+            raise ValueError("Generated code is not valid Python")
+        return {"python_code": f"run({literals[0]!r})"}
+
+    def plan_once():
+        return asyncio.run(
+            pipeline.arun_planning(
+                "q",
+                "count gate outs",
+                [{"name": "Sydney"}],
+                ["City", "Facility"],
+                [],
+                planner=planner,
+                codegen=codegen,
+                speculative=True,
+            )
+        )
+
+    plan_once()
+    _, code = plan_once()
+
+    assert code == "run('Melbourne')"
+    assert "Speculative code generation failed" in caplog.text
@@ -0,0 +1,35 @@
+"""Tests for the type-aware planner."""
+
+import dspy
+from dspy.utils import DummyLM
+
+from agent_poc.modules.planning.plan_generation import TypeAwarePlanner
+from agent_poc.utils.llm_cache import CACHE_DIR_ENV
+
+STEPS = [{"id": 1, "tool": "get_terminals_by_city", "inputs": {}, "output": "t"}]
+INPUTS = {
+    "query": "Which terminals are in Sydney?",
+    "intent": "list terminals",
+    "extracted_entities": [],
+    "candidate_tools": [{"name": "get_terminals_by_city"}],
+    "entity_schemas": [],
+    "relations": [],
+    "model_schemas": {},
+}
+
+
+def test_differently_configured_planners_do_not_share_disk_entries(
+    tmp_path, monkeypatch
+):
+    monkeypatch.setenv(CACHE_DIR_ENV, str(tmp_path))
+    lm = DummyLM([{"steps": STEPS}] * 3)
+    plain = TypeAwarePlanner(chain_of_thought=False, validate_plan=False)
+    with_demo = TypeAwarePlanner(chain_of_thought=False, validate_plan=False)
+    with_demo.planner.demos = [dspy.Example(**INPUTS, steps=STEPS)]
+
+    with dspy.context(lm=lm):
+        assert plain(**INPUTS)["steps"] == STEPS
+        assert plain(**INPUTS)["steps"] == STEPS
+        assert with_demo(**INPUTS)["steps"] == STEPS
+
+    assert len(lm.history) == 2
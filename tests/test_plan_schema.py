@@ -0,0 +1,27 @@
+"""Tests for planner output validation."""
+
+import pytest
+
+from agent_poc.modules.planning.plan_schema import validate_steps
+
+STEP = {"id": 1, "tool": "get_terminals_by_city", "inputs": {}, "output": "terminals"}
+
+
+def test_validate_steps_accepts_well_formed_plan():
+    steps = [STEP, {**STEP, "id": 2, "output": "facilities"}]
+
+    assert validate_steps(steps) is steps
+
+
+@pytest.mark.parametrize(
+    "steps",
+    [
+        [{k: v for k, v in STEP.items() if k != "tool"}],
+        [{**STEP, "id": "1"}],
+        [{**STEP, "output": "terminals[*]"}],
+        {"steps": [STEP]},
+    ],
+)
+def test_validate_steps_rejects_malformed_plan(steps):
+    with pytest.raises(ValueError, match="invalid plan"):
+        validate_steps(steps)
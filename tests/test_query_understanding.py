@@ -0,0 +1,121 @@
+"""Tests for the query-understanding prediction cache."""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import dspy
+import pytest
+from dspy.utils import DummyLM
+
+from agent_poc.modules.query_understanding.entity_matcher import EntityMatcher
+from agent_poc.modules.query_understanding.query_understanding import (
+    BulkQueryUnderstanding,
+    QueryUnderstanding,
+)
+from agent_poc.semantic_layer.engine import ontology_entities_json, semantic_layer
+
+ONTOLOGY = [("City", "A city."), ("Facility", "A terminal or depot.")]
+
+
+def test_repeated_query_is_served_from_cache():
+    lm = DummyLM([{"entities": ["City"], "intent": "count terminals"}] * 3)
+    qu = QueryUnderstanding()
+
+    with dspy.context(lm=lm):
+        first = qu(query="Terminals in Sydney?", ontology_entities=ONTOLOGY)
+        second = qu(query="Terminals in Sydney?", ontology_entities=list(ONTOLOGY))
+        # A different predictor state (e.g. optimizer demos) is a cache miss
+        qu.predict.demos = [dspy.Example(query="x", entities=[], intent="y")]
+        qu(query="Terminals in Sydney?", ontology_entities=ONTOLOGY)
+
+    assert second == first and second is not first
+    assert len(lm.history) == 2
+
+
+def test_cache_hits_are_copies_and_reuse_the_state_fingerprint(monkeypatch):
+    lm = DummyLM([{"entities": ["City"], "intent": "count terminals"}])
+    qu = QueryUnderstanding()
+    dumps = []
+    dump_state = qu.predict.dump_state
+    monkeypatch.setattr(
+        qu.predict, "dump_state", lambda: dumps.append(1) or dump_state()
+    )
+
+    with dspy.context(lm=lm):
+        first = qu(query="Terminals in Sydney?", ontology_entities=ONTOLOGY)
+        first.entities.append("Facility")
+        second = qu(query="Terminals in Sydney?", ontology_entities=ONTOLOGY)
+
+    assert second.entities == ["City"]
+    assert len(dumps) == 1
+
+
+def test_cache_is_shared_safely_across_threads_and_copies():
+    lm = DummyLM([{"entities": ["City"], "intent": "count terminals"}] * 200)
+    qu = QueryUnderstanding(cache_size=4)
+    queries = [f"Terminals in city {i % 8}?" for i in range(200)]
+
+    def understand(query):
+        with dspy.context(lm=lm):
+            return qu(query=query, ontology_entities=ONTOLOGY)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(understand, queries))
+
+    assert all(r.entities == ["City"] for r in results)
+    assert len(qu._cache) == 4
+    assert qu.deepcopy()._cache_lock is not qu._cache_lock
+
+
+def test_entity_matcher_narrows_ontology_for_literal_queries():
+    lm = DummyLM([{"entities": ["Facility"], "intent": "list terminals"}] * 2)
+    qu = QueryUnderstanding(
+        cache_size=0,
+        entity_matcher=EntityMatcher.from_entities(semantic_layer.entities.values()),
+    )
+
+    with dspy.context(lm=lm):
+        qu(query="Where are the terminals?", ontology_entities=ONTOLOGY)
+        qu(query="Terminals in Sydney?", ontology_entities=ONTOLOGY)
+
+    narrowed, full = (call["messages"][-1]["content"] for call in lm.history)
+    assert "City" not in narrowed and "Facility" in narrowed
+    assert "City" in full
+
+
+def test_ontology_is_rendered_as_compact_json():
+    lm = DummyLM([{"entities": ["City"], "intent": "count terminals"}])
+    qu = QueryUnderstanding(cache_size=0)
+
+    with dspy.context(lm=lm):
+        qu(query="Terminals in Sydney?", ontology_entities=ONTOLOGY)
+
+    prompt = lm.history[0]["messages"][-1]["content"]
+    assert '[["City","A city."],["Facility","A terminal or depot."]]' in prompt
+
+
+def test_ontology_defaults_to_the_semantic_layer():
+    lm = DummyLM([{"entities": ["City"], "intent": "count terminals"}])
+    qu = QueryUnderstanding(cache_size=0)
+
+    with dspy.context(lm=lm):
+        qu(query="Terminals in Sydney?")
+
+    assert ontology_entities_json in lm.history[0]["messages"][-1]["content"]
+
+
+def test_bulk_query_understanding_predicts_all_queries_in_one_call():
+    results = [
+        {"entities": ["City"], "intent": "count terminals"},
+        {"entities": ["Facility"], "intent": "list terminals"},
+    ]
+    lm = DummyLM([{"results": results}, {"results": results[:1]}])
+    bulk = BulkQueryUnderstanding()
+
+    with dspy.context(lm=lm):
+        preds = bulk(["Terminals in Sydney?", "Where are the terminals?"], ONTOLOGY)
+        with pytest.raises(ValueError):
+            bulk(["Terminals in Sydney?", "Where are the terminals?"], ONTOLOGY)
+
+    assert [p.intent for p in preds] == ["count terminals", "list terminals"]
+    assert preds[1].entities == ["Facility"]
+    assert len(lm.history) == 2
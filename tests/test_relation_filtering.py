@@ -0,0 +1,126 @@
+"""Tests for relation filtering batching and prefiltering."""
+
+import sys
+
+import dspy
+from dspy.utils import DummyLM
+
+from agent_poc.modules.semantic_grounding.relation_filtering import (
+    RelationFiltering,
+    pack_relations,
+    prefilter_relations,
+    verdicts_by_key,
+)
+from agent_poc.utils.semantic_cache import SemanticCache
+
+
+def _relation(name, description):
+    return ("A", name, "B", description)
+
+
+def test_pack_relations_fills_batches_up_to_the_token_budget():
+    relations = [
+        _relation("r0", "x" * 80),
+        _relation("r1", "x" * 40),
+        _relation("r2", "x" * 40),
+        _relation("r3", "x" * 4),
+    ]
+
+    batches = pack_relations(relations, max_batch_tokens=25)
+
+    assert [[r[1] for r in batch] for batch in batches] == [
+        ["r0", "r3"],
+        ["r1", "r2"],
+    ]
+
+
+def test_pack_relations_gives_oversized_relations_their_own_batch():
+    relations = [_relation("big", "x" * 400), _relation("small", "")]
+
+    batches = pack_relations(relations, max_batch_tokens=10)
+
+    assert [[r[1] for r in batch] for batch in batches] == [["big"], ["small"]]
+
+
+def test_prefilter_relations_keeps_the_most_similar_in_order():
+    relations = [
+        ("Shipment", "has_container", "Container", "Containers in a booking."),
+        ("City", "has_facility", "Facility", "Terminals located in a city."),
+        ("Container", "has_event", "ContainerEvent", "Gate moves of a container."),
+    ]
+
+    kept = prefilter_relations("Which terminals are in the city?", relations, 1)
+
+    assert kept == [relations[1]]
+    assert prefilter_relations("anything", relations, 5) == relations
+
+
+def test_top_k_judges_dropped_relations_no_without_llm():
+    relations = [
+        ("Shipment", "has_container", "Container", "Containers in a booking."),
+        ("City", "has_facility", "Facility", "Terminals located in a city."),
+    ]
+    lm = DummyLM(
+        [
+            {
+                "relevant": [
+                    {
+                        "source": "City",
+                        "name": "has_facility",
+                        "target": "Facility",
+                        "relevant": "yes",
+                    }
+                ]
+            }
+        ]
+    )
+
+    with dspy.context(lm=lm):
+        verdicts = RelationFiltering(top_k=1)(
+            query="Terminals in the city?", intent="list", relations=relations
+        )
+
+    assert verdicts == {
+        ("Shipment", "has_container", "Container"): "no",
+        ("City", "has_facility", "Facility"): "yes",
+    }
+    assert "Shipment" not in lm.history[0]["messages"][-1]["content"]
+
+
+def test_semantic_cache_is_bucketed_by_intent():
+    relations = [("City", "has_facility", "Facility", "Terminals in a city.")]
+    verdict = {
+        "source": "City",
+        "name": "has_facility",
+        "target": "Facility",
+        "relevant": "yes",
+    }
+    lm = DummyLM([{"relevant": [verdict]}] * 2)
+    filtering = RelationFiltering(semantic_cache=SemanticCache())
+
+    with dspy.context(lm=lm):
+        for intent in ("list", "list", "count"):
+            filtering(query="Terminals in Sydney?", intent=intent, relations=relations)
+
+    assert len(lm.history) == 2
+
+
+def test_verdicts_by_key_interns_key_parts():
+    source = "".join(["Cont", "ainer"])
+    verdicts = [{"source": source, "name": "at", "target": "B", "relevant": "yes"}]
+
+    ((key, verdict),) = verdicts_by_key(verdicts).items()
+
+    assert key == ("Container", "at", "B") and verdict == "yes"
+    assert key[0] is sys.intern("Container")
+
+
+def test_verdicts_by_key_skips_malformed_items(caplog):
+    verdicts = [
+        {"source": "A", "name": "r0", "target": "B", "relevant": "yes"},
+        {"source": "A", "name": "r1", "relevant": "no"},
+        "A r2 B yes",
+    ]
+
+    assert verdicts_by_key(verdicts) == {("A", "r0", "B"): "yes"}
+    assert caplog.text.count("malformed relation verdict") == 2
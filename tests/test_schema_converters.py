@@ -0,0 +1,139 @@
+"""Tests for the planner schema converters."""
+
+import json
+
+from agent_poc.modules.planning import pipeline
+from agent_poc.modules.planning.schema_converters import (
+    _RELATION_CACHE,
+    compact_model_schema,
+    entities_to_dict,
+    models_to_dict,
+    models_to_json,
+    relations_to_dict,
+    required_models,
+    tools_to_dict,
+    topo_sort_tools,
+)
+from agent_poc.semantic_layer.engine import semantic_layer
+from agent_poc.semantic_layer.generated_models.city import City
+from agent_poc.semantic_layer.generated_models.container import Container
+from agent_poc.semantic_layer.generated_models.facility import Facility
+from agent_poc.semantic_layer.ontology import RelationSchema
+from agent_poc.utils.fast_json import dumps
+
+
+def test_models_to_dict_reuses_cached_schema():
+    """Model schemas are built once per class and shared across calls."""
+    first = models_to_dict({"City": City, "Container": Container})
+    second = models_to_dict({"Container": Container})
+
+    assert set(first) == {"City", "Container"}
+    assert second["Container"] is first["Container"]
+    assert "properties" in first["City"]
+
+
+def test_tools_to_dict_drops_handler_and_memoizes():
+    tools = tools_to_dict(semantic_layer.get_tools_for_entity("Container"))
+
+    assert tools
+    assert all("handler" not in tool for tool in tools)
+    assert tools[0]["associated_entity"] == "Container"
+    assert (
+        tools_to_dict(semantic_layer.get_tools_for_entity("Container"))[0] is tools[0]
+    )
+
+
+def test_entities_and_relations_are_memoized_per_object():
+    city = semantic_layer.get_entity("City")
+    relation = semantic_layer.get_relation("City", "has_facility", "Facility")
+
+    assert entities_to_dict([city])[0] is entities_to_dict([city])[0]
+    assert relations_to_dict([relation])[0] is relations_to_dict([relation])[0]
+    assert entities_to_dict([city])[0]["name"] == "City"
+    assert relations_to_dict([relation])[0]["to_entity"] == "Facility"
+
+
+def test_memoized_dicts_are_dropped_with_their_object():
+    relation = RelationSchema(name="r", from_entity="A", to_entity="B")
+    relations_to_dict([relation])
+    assert id(relation) in _RELATION_CACHE
+
+    key = id(relation)
+    del relation
+    assert key not in _RELATION_CACHE
+
+
+def test_models_to_json_matches_models_to_dict():
+    models = {"City": City, "Container": Container}
+
+    assert json.loads(models_to_json(models)) == models_to_dict(models)
+
+
+def test_compact_model_schema_drops_prompt_noise_and_inlines_refs():
+    schema = {
+        "title": "Thing",
+        "properties": {
+            "description": {"type": "string", "title": "Description"},
+            "kind": {"$ref": "#/$defs/KindEnum", "description": "Kind"},
+        },
+        "$defs": {"KindEnum": {"enum": ["a", "b"], "title": "KindEnum"}},
+    }
+
+    assert compact_model_schema(schema) == {
+        "properties": {
+            "description": {"type": "string"},
+            "kind": {"enum": ["a", "b"]},
+        }
+    }
+    assert "$defs" in schema  # the input is left untouched
+
+
+def test_normalize_model_schema_strips_nested_date_time_formats():
+    schema = models_to_dict({"Container": Container})["Container"]
+
+    assert '"date-time"' not in json.dumps(schema)
+
+
+def test_compact_schemas_keep_every_field_path():
+    models = {"Container": Container, "Facility": Facility}
+    full = models_to_dict(models)
+    compact = models_to_dict(models, compact=True)
+
+    for name in models:
+        assert compact[name]["properties"].keys() == full[name]["properties"].keys()
+        assert "additionalProperties" not in json.dumps(compact[name])
+
+
+def test_topo_sort_tools_puts_producers_first():
+    tools = tools_to_dict(
+        semantic_layer.get_tools_for_entity("Facility")
+        + semantic_layer.get_tools_for_relation("City", "has_facility", "Facility")
+    )
+
+    ordered = topo_sort_tools(tools)
+
+    assert [t["name"] for t in ordered] == [
+        "get_terminals_by_city",
+        "get_facility_details",
+    ]
+    assert ordered[1]["depends_on"] == ["get_terminals_by_city"]
+    assert "depends_on" not in tools[0]  # memoized tool dicts are not modified
+
+
+def test_required_models_adds_tool_output_types():
+    tools = tools_to_dict(
+        semantic_layer.get_tools_for_relation(
+            "Facility", "hosts_event", "ContainerEvent"
+        )
+    )
+
+    assert {"Facility", "Containerevent"} <= required_models(tools, ["Facility"])
+
+
+def test_prepared_schemas_use_one_compact_json_encoding():
+    texts = pipeline._prepare_schemas(
+        ["City", "Facility"], [("City", "has_facility", "Facility")]
+    )
+
+    for text in texts:
+        assert text == dumps(json.loads(text))
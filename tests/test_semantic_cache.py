@@ -0,0 +1,44 @@
+"""Tests for the similarity-keyed in-memory cache."""
+
+from agent_poc.utils.semantic_cache import SemanticCache
+
+QUERY = "Where is container TEMU9876543 located?"
+
+
+def test_near_duplicate_text_hits_within_the_same_bucket():
+    cache = SemanticCache()
+    cache.put(QUERY, "value", bucket="relations-a")
+
+    assert cache.get("where is container TEMU9876543 located", "relations-a") == "value"
+    assert cache.get("where is container TEMU9876543 located", "relations-b") is None
+    assert cache.get("How many terminals are in Delhi?", "relations-a") is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_expired_and_overflowing_entries_are_dropped():
+    cache = SemanticCache(ttl=-1, max_entries=2)  # already expired
+    cache.put(QUERY, "value")
+
+    assert cache.get(QUERY) is None
+
+    cache.ttl = None
+    for i in range(3):
+        cache.put(f"{QUERY} {i}", i)
+    assert len(cache) == 2
+
+
+def test_negated_query_does_not_hit():
+    cache = SemanticCache()
+    cache.put("Which containers were gated out of Sydney terminal?", "value")
+
+    assert cache.get("Which containers were not gated out of Sydney terminal?") is None
+    assert cache.get("Which containers weren't gated out of Sydney terminal?") is None
+
+
+def test_query_for_another_date_does_not_hit():
+    cache = SemanticCache()
+    cache.put("How many containers were gated out on 20 July 2025?", "value")
+
+    assert cache.get("How many containers were gated out on 21 July 2025?") is None
+    assert cache.get("How many containers were gated out on 20 June 2025?") is None
+    assert cache.get("how many containers were gated out on 20 July 2025") == "value"
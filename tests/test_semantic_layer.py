@@ -0,0 +1,67 @@
+"""Tests for the semantic layer engine helpers."""
+
+from agent_poc.semantic_layer.engine import (
+    ONTOLOGY_SOURCE_PATH,
+    SemanticLayer,
+    build_semantic_layer,
+    semantic_layer,
+)
+from agent_poc.semantic_layer.ontology import RelationSchema
+
+
+def test_candidate_tools_lists_relation_tools_first_without_duplicates():
+    relation = ("City", "has_facility", "Facility")
+    tools = semantic_layer.candidate_tools([relation, list(relation)], ["Facility"])
+
+    names = [t.name for t in tools]
+    assert names == ["get_terminals_by_city", "get_facility_details"]
+
+
+def test_relations_by_entity_matches_list_relations():
+    for name in semantic_layer.entities:
+        expected = [
+            (r.from_entity, r.name, r.to_entity, r.description or "")
+            for r in semantic_layer.list_relations(name)
+        ]
+        assert list(semantic_layer.relations_by_entity.get(name, ())) == expected
+
+
+def test_build_semantic_layer_is_built_once_per_ontology():
+    assert build_semantic_layer(str(ONTOLOGY_SOURCE_PATH)) is semantic_layer
+    assert semantic_layer.tools
+
+
+def test_relation_indexes_match_a_full_scan():
+    for name in semantic_layer.entities:
+        relations = semantic_layer.relations.values()
+        assert semantic_layer.list_relations_from(name) == [
+            r for r in relations if r.from_entity == name
+        ]
+        assert semantic_layer.list_relations_to(name) == [
+            r for r in relations if r.to_entity == name
+        ]
+    assert semantic_layer.list_relations("Unknown") == []
+
+
+def test_find_entity_by_label_matches_names_and_synonyms():
+    for entity in semantic_layer.entities.values():
+        for label in (entity.name, *entity.synonyms):
+            assert semantic_layer.find_entity_by_label(label.upper()) is entity
+    assert semantic_layer.find_entity_by_label("no such entity") is None
+
+
+def test_directly_constructed_layer_is_fully_indexed():
+    relation = RelationSchema(name="at", from_entity="A", to_entity="B")
+    layer = SemanticLayer(
+        entities={},
+        relations={relation.key: relation},
+        tools={},
+        tools_by_relation={},
+        tools_by_entity={},
+    )
+
+    assert layer.relations_by_entity == {
+        "A": (("A", "at", "B", ""),),
+        "B": (("A", "at", "B", ""),),
+    }
+    assert layer.list_relations("B") == [relation]
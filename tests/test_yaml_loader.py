@@ -0,0 +1,34 @@
+"""Tests for the shared YAML loader."""
+
+import os
+
+from agent_poc.semantic_layer.ontology import load_ontology
+from agent_poc.utils.disk_cache import CACHE_DIR_ENV
+from agent_poc.utils.yaml_loader import load_yaml_cached
+
+
+def test_yaml_is_served_from_disk_cache_until_modified(tmp_path, monkeypatch):
+    monkeypatch.setenv(CACHE_DIR_ENV, str(tmp_path / "cache"))
+    path = tmp_path / "a.yaml"
+    path.write_text("name: A\ndescription: first\n")
+    assert load_yaml_cached(path)["description"] == "first"
+    stat = path.stat()
+
+    # Same modification time: still the cached parse
+    path.write_text("name: A\ndescription: second\n")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert load_yaml_cached(path)["description"] == "first"
+
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert load_yaml_cached(path)["description"] == "second"
+
+
+def test_ontology_files_are_loaded_through_the_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv(CACHE_DIR_ENV, str(tmp_path / "cache"))
+    ontology = tmp_path / "ontology.yaml"
+    ontology.write_text("entities:\n  A:\n    description: first\n")
+    assert load_ontology(ontology)[0]["A"].description == "first"
+
+    ontology.write_text("entities:\n  A:\n    description: second\n")
+    os.utime(ontology, ns=(0, ontology.stat().st_mtime_ns + 10**9))
+    assert load_ontology(ontology)[0]["A"].description == "second"